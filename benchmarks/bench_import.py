@@ -0,0 +1,77 @@
+"""Import time of the xontrib's modules, as reported by ``python -X importtime``.
+
+xonsh's own modules are imported beforehand, as they are already loaded
+in a running shell, so only the cost added by this package is reported.
+
+    python benchmarks/bench_import.py [--max-ms 5]
+"""
+import argparse
+import subprocess
+import sys
+
+# loaded by xonsh itself before any xontrib
+PRELOAD = [
+    "xonsh.built_ins",
+    "xonsh.completers.tools",
+    "xonsh.completers.completer",
+    "xonsh.parsers.completion_context",
+]
+MODULES = [
+    "xontrib_term_integrations.utils",
+    "xontrib_term_integrations.semantic_prompt",
+    "xontrib_term_integrations.identity",
+    "xontrib_term_integrations.aliases",
+    "xontrib_term_integrations.kitty_completions",
+    # what loading the xontrib imports in a session
+    "xontrib_term_integrations.registry",
+    "xontrib.term_integration",
+]
+PACKAGE = "xontrib_term_integrations"
+
+
+def import_time(module: str):
+    """cumulative import time (us) of each module pulled in by importing ``module``"""
+    code = ";".join(f"import {mod}" for mod in PRELOAD + [module])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="exit with an error when a module takes longer than this to import",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        times = import_time(module)
+        took = times.get(module, 0) / 1000
+        extra = sorted(
+            (name for name in times if not name.startswith(PACKAGE)),
+            key=times.get,
+            reverse=True,
+        )
+        print(f"{module:<45} {took:7.2f} ms  {', '.join(extra[:3])}")
+        if args.max_ms is not None and took > args.max_ms:
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
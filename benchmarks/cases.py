@@ -0,0 +1,195 @@
+"""Benchmark cases of the xontrib's hot paths, runnable without a terminal.
+
+Each case is a no-argument callable, measured by ``run.py``.
+"""
+import os
+import sys
+import tempfile
+from typing import Callable, Dict
+
+from xonsh.built_ins import XSH
+from xonsh.environ import Env
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class MemoryOut:
+    """in-memory stand-in for sys.stdout that only counts what is written"""
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, text: str):
+        self.written += len(text)
+
+    def flush(self):
+        pass
+
+
+def stub_kitty_dir() -> str:
+    """directory with a ``kitty`` executable answering like ``kitty +complete``"""
+    path = tempfile.mkdtemp(prefix="bench-kitty-")
+    os.symlink(os.path.join(HERE, "stub_kitty.py"), os.path.join(path, "kitty"))
+    return path
+
+
+def setup_session():
+    XSH.env = Env(
+        PATH=[stub_kitty_dir()] + os.environ.get("PATH", "").split(os.pathsep),
+        HOSTNAME="bench-host",
+        USER="bench",
+        XONTRIB_TERM_INTEGRATIONS_KITTY_WORKER=False,
+        # once crawled, the index would answer the "cold" completions as well
+        XONTRIB_TERM_INTEGRATIONS_KITTY_INDEX=False,
+    )
+    sys.stdout = MemoryOut()
+
+
+def old_prompt():
+    return (
+        "{env_name}{BOLD_GREEN}{user}@{hostname}{BOLD_BLUE} {cwd}{RESET} {prompt_end} "
+    )
+
+
+def prompt_cases() -> Dict[str, Callable]:
+    from xontrib_term_integrations.semantic_prompt import ShellIntegrationPrompt
+
+    cases = {"prompt/bare": old_prompt}
+    for name in ["PROMPT", "RIGHT_PROMPT", "BOTTOM_TOOLBAR", "MULTILINE_PROMPT"]:
+        env = {name: old_prompt}
+        cases[f"prompt/{name}"] = ShellIntegrationPrompt(
+            env, prompt_name=name, extend=True, ext_opt={"cl": "m", "aid": 42}
+        )
+    cases["prompt/PROMPT-plain"] = ShellIntegrationPrompt({"PROMPT": old_prompt})
+    return cases
+
+
+# arguments for every ``utils.write_*`` helper
+WRITE_ARGS = {
+    "write_term_mark": ("A",),
+    "write_osc_cmd": ("ShellIntegrationVersion=15;shell=xonsh",),
+    "write_osc7_cmd": ("file://bench-host/tmp",),
+    "write_dcs_cmd": ("tmux;payload",),
+    "write_tmux_cmd": ("\x1b]1337;SetUserVar=a=Yg==\x07",),
+    "write_osc_output_prefix": (),
+    "write_osc_cmd_status": (0,),
+    "write_to_out": ("\x1b]133;C\x07",),
+    "write_osc_shell_integration": (),
+    "write_osc_cwd": ("/home/bench/projects/xontrib-term-integrations",),
+    "write_osc7_cwd": ("bench-host", "/home/bench/projects/xontrib-term-integrations"),
+    "write_osc_user_host": ({"USER": "bench", "HOSTNAME": "bench-host"},),
+}
+
+
+# ``write_*`` names of utils that don't write a sequence
+NOT_WRITERS = {"write_monitor"}
+
+
+def write_cases() -> Dict[str, Callable]:
+    from xontrib_term_integrations import utils
+
+    helpers = {
+        name
+        for name in dir(utils)
+        if name.startswith("write_") and name not in NOT_WRITERS
+    }
+    missing = helpers - set(WRITE_ARGS)
+    if missing:
+        names = ", ".join(sorted(missing))
+        print(f"warning: no benchmark for {names}", file=sys.stderr)
+
+    def case(func, args):
+        return lambda: func(*args)
+
+    return {
+        f"write/{name}": case(getattr(utils, name), args)
+        for name, args in WRITE_ARGS.items()
+        if name in helpers
+    }
+
+
+def user_var_cases() -> Dict[str, Callable]:
+    from xontrib_term_integrations import tmux, utils
+
+    cmd = "git log --oneline --graph --decorate --all | head -n 40"
+    direct = tmux.Strategy(tmux.DIRECT)
+    passthrough = tmux.Strategy(tmux.PASSTHROUGH)
+
+    def plain():
+        tmux._strategy = direct
+        utils.set_user_var("WEZTERM_PROG", cmd)
+
+    def in_tmux():
+        tmux._strategy = passthrough
+        utils.set_user_var("WEZTERM_PROG", cmd)
+
+    heredoc = "cat <<EOF\n" + "a pasted line of a long heredoc\n" * 256 + "EOF"
+
+    def huge():
+        tmux._strategy = direct
+        utils.set_user_var("WEZTERM_PROG", heredoc)
+
+    return {"user_var/plain": plain, "user_var/tmux": in_tmux, "user_var/huge": huge}
+
+
+def cwd_cases() -> Dict[str, Callable]:
+    from xontrib_term_integrations import cwd
+
+    cwd._report = cwd.report_osc7
+    dirs = [f"/home/bench/projects/dir {idx}" for idx in range(100)]
+
+    def burst():
+        # a script cd-ing through 100 directories, then the next prompt
+        for newdir in dirs:
+            cwd.onchdir(None, newdir)
+        cwd.flush_cwd()
+
+    return {"cwd/burst": burst}
+
+
+def completion_cases() -> Dict[str, Callable]:
+    from xontrib_term_integrations import kitty_completions
+    from xontrib_term_integrations.completion_cache import cache
+    from xontrib_term_integrations.completion_records import RecordTable
+
+    def cold():
+        cache.clear()
+        list(kitty_completions.get_completions("kitty", "--option-1"))
+
+    def cached():
+        list(kitty_completions.get_completions("kitty", "--option-1"))
+
+    def narrowed():
+        cache.clear()
+        list(kitty_completions.get_completions("kitty", "--option-"))
+        list(kitty_completions.get_completions("kitty", "--option-1"))
+
+    lines = [f"--option-{idx:03}\tdescription of option {idx}" for idx in range(300)]
+    table = RecordTable()
+
+    def parse_fresh():
+        list(kitty_completions.generate_completions_from_lines(lines))
+
+    def parse_records():
+        list(kitty_completions.generate_completions_from_lines(lines, table=table))
+
+    return {
+        "kitty/cold": cold,
+        "kitty/cached": cached,
+        "kitty/narrowed": narrowed,
+        "kitty/parse-fresh": parse_fresh,
+        "kitty/parse-records": parse_records,
+    }
+
+
+def all_cases() -> Dict[str, Callable]:
+    cases = {}
+    for group in [
+        prompt_cases,
+        write_cases,
+        user_var_cases,
+        cwd_cases,
+        completion_cases,
+    ]:
+        cases.update(group())
+    return cases
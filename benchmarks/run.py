@@ -0,0 +1,131 @@
+"""Benchmark suite for prompt rendering, OSC emission and completion latency.
+
+Reports throughput and latency percentiles per case and compares them with
+the stored baseline, failing when a case got slower than the threshold.
+
+    python benchmarks/run.py                  # compare with benchmarks/baseline.json
+    python benchmarks/run.py --save-baseline  # store the results as the new baseline
+    python benchmarks/run.py -k kitty         # only the cases containing "kitty"
+    python benchmarks/run.py --allocs         # add the memory allocated per call
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import cases  # noqa: E402
+
+BASELINE = os.path.join(HERE, "baseline.json")
+# calls timed together, to keep the timer's own overhead out of fast cases
+BLOCK = 50
+
+
+def measure(func, seconds: float) -> dict:
+    """per-call latencies of ``func`` for about ``seconds``"""
+    for _ in range(BLOCK):  # warm up caches and workers
+        func()
+    samples: List[float] = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(samples) < 20:
+        start = time.perf_counter_ns()
+        for _ in range(BLOCK):
+            func()
+        samples.append((time.perf_counter_ns() - start) / BLOCK)
+    samples.sort()
+
+    def pct(val: float):
+        return samples[int(val * (len(samples) - 1))] / 1000
+
+    return {
+        "ops_per_sec": 1e9 * len(samples) / sum(samples),
+        "p50_us": pct(0.50),
+        "p90_us": pct(0.90),
+        "p99_us": pct(0.99),
+    }
+
+
+def peak_alloc(func) -> int:
+    """peak of the memory allocated (bytes) during a warmed-up call"""
+    func()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE):
+        return {}
+    with open(BASELINE) as fr:
+        return json.load(fr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-k", default="", help="run only the cases containing this")
+    parser.add_argument(
+        "--seconds", type=float, default=0.5, help="time spent on each case"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed p50 slowdown against the baseline (0.25 = 25%%)",
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--allocs",
+        action="store_true",
+        help="measure the memory allocated per call as well",
+    )
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    cases.setup_session()
+    baseline = load_baseline()
+    results = {}
+    regressions = []
+    print(
+        f"{'case':<36} {'ops/s':>12} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9}",
+        file=stdout,
+    )
+    for name, func in cases.all_cases().items():
+        if args.k not in name:
+            continue
+        res = results[name] = measure(func, args.seconds)
+        line = (
+            f"{name:<36} {res['ops_per_sec']:>12.0f} {res['p50_us']:>9.2f} "
+            f"{res['p90_us']:>9.2f} {res['p99_us']:>9.2f}"
+        )
+        if args.allocs:
+            res["alloc_bytes"] = peak_alloc(func)
+            line += f"  {res['alloc_bytes'] / 1024:.1f} KiB"
+        if name in baseline:
+            change = res["p50_us"] / baseline[name]["p50_us"] - 1
+            line += f"  {change:+.0%}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += " REGRESSION"
+        print(line, file=stdout)
+
+    sys.stdout = stdout
+    if args.save_baseline:
+        with open(BASELINE, "w") as fw:
+            json.dump({**baseline, **results}, fw, indent=2, sort_keys=True)
+        print(f"saved baseline to {BASELINE}")
+    elif regressions:
+        print(f"slower than the baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
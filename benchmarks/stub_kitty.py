@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""Stands in for ``kitty +complete fish2``: completes the last token
+from a fixed option vocabulary, so completion benchmarks need no kitty install."""
+import sys
+
+OPTIONS = [f"--option-{idx:03}\tdescription of option {idx}" for idx in range(300)]
+OPTIONS += ["--config\tSpecify a path to the configuration file", "--debug-input\t"]
+
+
+def main():
+    tokens = sys.stdin.read().split("\n")
+    prefix = tokens[-1] if tokens else ""
+    matches = (line for line in OPTIONS if line.startswith(prefix))
+    sys.stdout.write("".join(f"{line}\n" for line in matches))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import pytest
+from xonsh.built_ins import XSH
+
+
+@pytest.fixture
+def xsh_env(monkeypatch):
+    """a plain dict standing in for the session's ``$`` environment"""
+    env = {}
+    monkeypatch.setattr(XSH, "env", env, raising=False)
+    return env
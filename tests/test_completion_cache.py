@@ -0,0 +1,98 @@
+import pytest
+
+from xontrib_term_integrations.completion_cache import (
+    CompletionCache,
+    can_narrow,
+    narrow,
+)
+
+CTX = ("/usr/bin/kitty", "/home", ("kitty",))
+OPTIONS = ["--config", "--debug-input", "--debug-gl", "--detach", "--directory"]
+
+
+@pytest.fixture
+def cache(xsh_env):
+    return CompletionCache()
+
+
+def test_hit_and_miss(cache):
+    assert cache.get(CTX, "--d") is None
+    cache.put(CTX, "--d", OPTIONS[1:])
+    assert cache.get(CTX, "--d") == sorted(OPTIONS[1:])
+    assert cache.stats() == {
+        "entries": 1,
+        "hits": 1,
+        "narrowed": 0,
+        "misses": 1,
+        "evictions": 0,
+    }
+
+
+def test_longer_prefix_is_narrowed(cache):
+    cache.put(CTX, "--", OPTIONS)
+    assert cache.get(CTX, "--de") == ["--debug-gl", "--debug-input", "--detach"]
+    assert cache.get(CTX, "--debug-") == ["--debug-gl", "--debug-input"]
+    assert cache.get(CTX, "--x") == []
+    assert cache.narrowed == 3
+
+
+def test_other_context_is_a_miss(cache):
+    cache.put(CTX, "--", OPTIONS)
+    assert cache.get(("/usr/bin/kitty", "/tmp", ("kitty",)), "--de") is None
+
+
+def test_capped_entry_is_not_narrowed(cache):
+    cache.put(CTX, "--", OPTIONS[:2], complete=False)
+    assert cache.get(CTX, "--") == sorted(OPTIONS[:2])
+    assert cache.get(CTX, "--de") is None
+
+
+def test_empty_prefix_is_not_narrowed(cache):
+    cache.put(CTX, "", ["dir/", "file"])
+    assert cache.get(CTX, "f") is None
+
+
+@pytest.mark.parametrize("prefix", ["--config=", "dir/"])
+def test_no_narrowing_across_boundaries(cache, prefix):
+    cache.put(CTX, prefix[:-1], [prefix[:-1]])
+    assert cache.get(CTX, prefix + "x") is None
+
+
+def test_ttl(cache, xsh_env):
+    xsh_env["XONTRIB_TERM_INTEGRATIONS_COMPLETION_CACHE_TTL"] = 10
+    cache.put(CTX, "--", OPTIONS)
+    cache.entries[(CTX, "--")].stamp -= 11
+    assert cache.get(CTX, "--") is None
+    assert cache.get(CTX, "--de") is None
+    # still there for callers that would otherwise block
+    assert cache.get(CTX, "--", allow_stale=True) == sorted(OPTIONS)
+    assert cache.get(CTX, "--de", allow_stale=True) == [
+        "--debug-gl",
+        "--debug-input",
+        "--detach",
+    ]
+
+
+def test_evicts_least_recently_used(cache, xsh_env):
+    xsh_env["XONTRIB_TERM_INTEGRATIONS_COMPLETION_CACHE_SIZE"] = 2
+    cache.put(CTX, "a", ["a1"])
+    cache.put(CTX, "b", ["b1"])
+    cache.get(CTX, "a")
+    cache.put(CTX, "c", ["c1"])
+    assert cache.get(CTX, "b") is None
+    assert cache.get(CTX, "a") == ["a1"]
+    assert cache.evictions == 1
+
+
+def test_can_narrow():
+    assert can_narrow("--d", "--deb")
+    assert not can_narrow("--deb", "--d")
+    assert not can_narrow("--c", "--config=x")
+    assert not can_narrow("di", "dir/sub")
+
+
+def test_narrow():
+    lines = sorted(OPTIONS)
+    assert narrow(lines, "--debug") == ["--debug-gl", "--debug-input"]
+    assert narrow(lines, "--z") == []
+    assert narrow([], "--") == []
@@ -0,0 +1,89 @@
+import base64
+
+from xontrib_term_integrations import recorder, tmux
+
+ESC = "\x1b"
+
+
+def user_var(name, val):
+    return f"{ESC}]1337;SetUserVar={name}={base64.b64encode(val.encode()).decode()}\x07"
+
+
+def test_semantic_zones():
+    term = recorder.FakeTerminal()
+    found = term.feed(f"{ESC}]133;A\x07{ESC}]133;P;k=i\x07$ {ESC}]133;B{ESC}\\")
+    assert found == ["133;A", "133;P", "133;B"]
+    assert term.marks == ["A", "P", "B"]
+    assert term.counts["133;P"] == 1
+
+
+def test_cwd_is_unquoted():
+    term = recorder.FakeTerminal()
+    assert term.feed(f"{ESC}]7;file://host/tmp/a%20b/%C3%A4\x07") == ["7"]
+    assert term.cwd == "/tmp/a b/ä"
+
+
+def test_iterm2_sequences():
+    term = recorder.FakeTerminal()
+    term.feed(f"{ESC}]1337;CurrentDir=/srv\x07{ESC}]1337;RemoteHost=me@box\x07")
+    assert term.cwd == "/srv"
+    assert term.remote_host == "me@box"
+
+
+def test_user_var_is_decoded():
+    term = recorder.FakeTerminal()
+    assert term.feed(user_var("WEZTERM_PROG", "ls -l ü")) == ["1337;SetUserVar"]
+    assert term.user_vars == {"WEZTERM_PROG": "ls -l ü"}
+
+
+def test_tmux_passthrough_is_unwrapped():
+    term = recorder.FakeTerminal()
+    data = tmux.wrap(user_var("WEZTERM_IN_TMUX", "1"), depth=2)
+    data += tmux.wrap(f"{ESC}]133;C\x07")
+    assert term.feed(data) == ["1337;SetUserVar", "133;C"]
+    assert term.user_vars == {"WEZTERM_IN_TMUX": "1"}
+    assert term.malformed == 0
+
+
+def test_other_sequences():
+    term = recorder.FakeTerminal()
+    assert term.feed(f"{ESC}[0m{ESC}]0;title\x07{ESC}Pq{ESC}\\") == [
+        "esc",
+        "osc 0",
+        "dcs",
+    ]
+
+
+def test_malformed():
+    term = recorder.FakeTerminal()
+    # unterminated OSC: the rest can't be parsed
+    assert term.feed(f"{ESC}]133;A\x07{ESC}]7;file://h/tmp") == ["133;A"]
+    assert term.feed(f"{ESC}Ptmux;{ESC}{ESC}]133;C\x07") == []
+    term.feed(f"{ESC}]1337;SetUserVar=X=not*base64\x07")
+    not_utf8 = base64.b64encode(b"\xff").decode()
+    term.feed(f"{ESC}]1337;SetUserVar=X={not_utf8}\x07")
+    assert term.malformed == 4
+    assert term.user_vars == {}
+
+
+def test_analyze():
+    entries = [
+        {"s": 1, "t": 0, "h": "render_prompt", "n": 10, "d": f"{ESC}]133;A\x07"},
+        {"s": 2, "t": 5, "h": "on_precommand", "n": 10, "d": f"{ESC}]133;C\x07"},
+        {"s": 3, "t": 9, "h": "on_postcommand", "n": 10, "d": f"{ESC}]133;D\x07"},
+        {"s": 4, "t": 9, "h": "on_postcommand", "ns": 4000},
+        {"s": 5, "t": 9, "h": "render_prompt", "n": 10, "d": f"{ESC}]133;A\x07"},
+    ]
+    data = recorder.analyze(entries)
+    assert data["bytes_per_prompt"]["count"] == 2
+    assert data["bytes_per_prompt"]["max"] == 30
+    assert data["sequences_per_command"]["max"] == 3
+    assert data["slowest_hooks"]["on_postcommand"]["p99_us"] == 4
+    assert data["slowest_hooks"]["on_postcommand"]["bytes"] == 10
+
+
+def test_percentile_nearest_rank():
+    assert recorder.percentile([], 0.99) == 0
+    assert recorder.percentile([3, 1, 2], 0.5) == 2
+    assert recorder.percentile(range(1, 101), 0.99) == 99
+    assert recorder.percentile([5, 1], 0.99) == 5
@@ -0,0 +1,41 @@
+import pytest
+
+from xontrib_term_integrations import tmux
+
+ESC = "\x1b"
+SEQ = f"{ESC}]1337;SetUserVar=WEZTERM_PROG=bHM=\x07"
+
+
+def test_wrap_doubles_esc():
+    assert tmux.wrap(SEQ) == f"{ESC}Ptmux;{ESC}{SEQ}{ESC}\\"
+
+
+def test_wrap_nested():
+    once = tmux.wrap(SEQ)
+    assert tmux.wrap(SEQ, depth=2) == f"{ESC}Ptmux;{once.replace(ESC, ESC * 2)}{ESC}\\"
+
+
+def test_strategy_modes():
+    assert tmux.Strategy(tmux.DIRECT).wrap(SEQ) == SEQ
+    assert tmux.Strategy(tmux.DROP).wrap(SEQ) is None
+    assert tmux.Strategy(tmux.PASSTHROUGH, 2).wrap(SEQ) == tmux.wrap(SEQ, 2)
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    [
+        tmux.Strategy(tmux.DIRECT),
+        tmux.Strategy(tmux.PASSTHROUGH),
+        tmux.Strategy(tmux.PASSTHROUGH, 3),
+    ],
+    ids=["direct", "passthrough", "nested"],
+)
+def test_affixes_match_wrap(strategy):
+    head, tail = f"{ESC}]1337;SetUserVar=WEZTERM_PROG=", "\x07"
+    prefix, suffix = strategy.affixes(head, tail)
+    assert prefix + "bHM=" + suffix == strategy.wrap(head + "bHM=" + tail)
+    assert strategy.affixes(head, tail) == (prefix, suffix)
+
+
+def test_affixes_dropped():
+    assert tmux.Strategy(tmux.DROP).affixes(f"{ESC}]7;", "\x07") == ("", "")
@@ -0,0 +1,69 @@
+import pytest
+
+from xontrib_term_integrations import utils
+
+MARK = utils.TRUNCATION_MARK
+
+
+@pytest.fixture
+def limit(xsh_env):
+    def set_limit(max_bytes, hashed=False):
+        xsh_env["XONTRIB_TERM_INTEGRATIONS_USER_VAR_MAX_BYTES"] = max_bytes
+        xsh_env["XONTRIB_TERM_INTEGRATIONS_USER_VAR_HASH"] = hashed
+
+    return set_limit
+
+
+def test_short_value_is_kept(limit):
+    limit(16)
+    val = "ä" * 8
+    assert utils.bounded_payload(val.encode()) == val.encode()
+
+
+def test_no_limit(limit):
+    limit(0)
+    val = b"x" * 5000
+    assert utils.bounded_payload(val) is val
+
+
+def test_ascii_keeps_head_and_tail(limit):
+    limit(13)
+    out = bytes(utils.bounded_payload(b"abcdefghijklmnopqrstuvwxyz"))
+    assert out == b"abcde" + MARK + b"vwxyz"
+    assert len(out) == 13
+
+
+@pytest.mark.parametrize("max_bytes", range(3, 40))
+@pytest.mark.parametrize("char", ["é", "€", "😀"])
+def test_cut_at_character_boundaries(limit, max_bytes, char):
+    limit(max_bytes)
+    val = ("a" + char) * 20
+    out = bytes(utils.bounded_payload(val.encode()))
+    assert len(out) <= max_bytes
+    head, _, tail = out.decode().partition("…")
+    assert val.startswith(head)
+    assert val.endswith(tail)
+
+
+def test_limit_below_the_mark_sends_the_mark(limit):
+    limit(1)
+    assert bytes(utils.bounded_payload("ü".encode() * 10)) == MARK
+    # not shorter than the mark, left as is
+    assert utils.bounded_payload(b"abc") == b"abc"
+
+
+def test_hash_tells_long_values_apart(limit):
+    limit(32, hashed=True)
+    first = bytes(utils.bounded_payload(b"a" * 100 + b"1" + b"a" * 100))
+    second = bytes(utils.bounded_payload(b"a" * 100 + b"2" + b"a" * 100))
+    assert first != second
+    assert len(first) == len(second) == 32
+    assert first.count(MARK) == 2
+
+
+def test_counts_truncations(limit, monkeypatch):
+    monkeypatch.setattr(utils, "user_vars_truncated", 0)
+    limit(8)
+    utils.bounded_payload(b"short")
+    utils.bounded_payload(b"x" * 20)
+    assert utils.user_vars_truncated == 1
@@ -1,5 +1,3 @@
-import os
-
 from xonsh.built_ins import XSH
 
 # don't export any to xonsh context
@@ -9,22 +7,29 @@ env = XSH.env or {}
 
 # load during interactive sessions only
 if env.get("XONSH_INTERACTIVE", False):
-    TERMINFO = os.getenv("TERMINFO", "").lower()
-    TERM = os.getenv("TERM", "").lower()
-    TERM_PROGRAM = os.getenv("TERM_PROGRAM", "").lower()
-    # avoid terminals that don't like OSC sequences
-    if TERM not in {"dumb", "linux"}:
-        if ("kitty" in TERMINFO) or ("kitty" in TERM):
-            import xontrib_term_integrations.kitty  # noqa
-        elif (
-            ("wezterm" in TERMINFO)
-            or ("wezterm" in TERM)
-            or ("wezterm" in TERM_PROGRAM)
-        ):
-            import xontrib_term_integrations.wezterm  # noqa
-
-            # todo: fails in a root shell https://github.com/wez/wezterm/issues/3114
-        else:
-            # fallback
-            # if "iTerm" in os.getenv("TERM_PROGRAM", ""):
-            import xontrib_term_integrations.iterm2  # noqa
+    from xontrib_term_integrations import detect
+
+    if record := env.get("XONTRIB_TERM_INTEGRATIONS_RECORD"):
+        from xontrib_term_integrations import recorder
+
+        recorder.start(record)
+
+    if env.get("XONTRIB_TERM_INTEGRATIONS_ASYNC_WRITER", False):
+        from xontrib_term_integrations import writer
+
+        writer.start(int(env.get("XONTRIB_TERM_INTEGRATIONS_ASYNC_WRITER_QUEUE", 64)))
+
+    caps = detect.capabilities()
+    backend = caps.backend
+    if backend:
+        from xontrib_term_integrations import registry
+
+        # the features this terminal supports, not a fixed set per backend
+        registry.start(caps)
+
+    if backend and not env.get("XONTRIB_TERM_INTEGRATIONS_SKIP_ALIAS", False):
+        from xontrib_term_integrations.utils import LazyAlias
+
+        XSH.aliases["term_integration_stats"] = LazyAlias(
+            "term_integration_stats_alias"
+        )
@@ -0,0 +1,105 @@
+"""xonsh aliases of the xontrib.
+
+Importing ``xonsh.cli_utils`` and building the argparse aliases is deferred
+until an alias is first used, see ``utils.LazyAlias``.
+"""
+from typing import Optional
+
+from xonsh.cli_utils import Annotated, Arg, ArgParserAlias
+
+from . import utils
+
+
+def set_user_var_fn(
+    var: str, val: Annotated[Optional[str], Arg(nargs="?")] = ""  # noqa
+):
+    """Sets a terminal pane's user `Variable` to a given `Value`
+    (see ``wezfurlong.org/wezterm/shell-integration.html#user-vars`` for details)
+
+    Parameters
+    ----------
+    var
+        Variable name
+    val
+        Variable value (defaults to an empty string)
+    """
+
+    utils.set_user_var(var, val)
+
+
+set_user_var_alias = ArgParserAlias(
+    func=set_user_var_fn, has_args=True, prog="set_user_var"
+)
+set_wezterm_user_var_alias = ArgParserAlias(
+    func=set_user_var_fn, has_args=True, prog="set_wezterm_user_var"
+)
+
+
+def resync_user_vars_fn():
+    """Re-send every user var set in this session to the terminal pane
+    (e.g. after re-attaching a tmux/ssh session in another pane)"""
+    utils.resync_user_vars()
+
+
+resync_user_vars_alias = ArgParserAlias(
+    func=resync_user_vars_fn, has_args=True, prog="resync_user_vars"
+)
+
+
+def completion_stats_fn(reset: Annotated[bool, Arg("--reset")] = False):  # noqa
+    """Show the hit/miss counters of the kitty completion cache
+
+    Parameters
+    ----------
+    reset
+        Drop the cached completions and reset the counters
+    """
+    from .completion_cache import cache
+
+    if reset:
+        cache.clear()
+    return "".join(f"{name}: {val}\n" for name, val in cache.stats().items())
+
+
+completion_stats_alias = ArgParserAlias(
+    func=completion_stats_fn, has_args=True, prog="kitty_completion_stats"
+)
+
+
+def term_integration_stats_fn(
+    json: Annotated[bool, Arg("--json")] = False,  # noqa
+    reset: Annotated[bool, Arg("--reset")] = False,  # noqa
+):
+    """Show the call count, latency and bytes written by each integration hook
+    (enable them with ``$XONTRIB_TERM_INTEGRATIONS_STATS = True``)
+
+    Parameters
+    ----------
+    json
+        Print the numbers as JSON, e.g. to compare panes and hosts
+    reset
+        Reset the counters
+    """
+    import json as _json
+
+    from . import stats
+
+    if reset:
+        stats.reset()
+        return
+    if not stats.enabled():
+        from . import bandwidth
+
+        return (
+            stats.format_low_bandwidth(bandwidth.report())
+            + "\nstats are disabled, set $XONTRIB_TERM_INTEGRATIONS_STATS = True\n"
+        )
+    data = stats.report()
+    if json:
+        return _json.dumps(data, indent=2) + "\n"
+    return stats.format_table(data)
+
+
+term_integration_stats_alias = ArgParserAlias(
+    func=term_integration_stats_fn, has_args=True, prog="term_integration_stats"
+)
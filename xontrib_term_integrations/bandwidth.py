@@ -0,0 +1,91 @@
+"""Low-bandwidth profile: fewer and shorter sequences over slow links.
+
+``$XONTRIB_TERM_INTEGRATIONS_LOW_BANDWIDTH`` is ``"auto"`` by default, turning it on
+in SSH sessions (``$SSH_CONNECTION``) or once writes to the terminal turn out slow
+(averaging over ``$XONTRIB_TERM_INTEGRATIONS_SLOW_WRITE_MS``, default 20),
+``True``/``False`` force it on/off. When on
+
+- only ``$PROMPT`` is marked, not the right prompt, toolbar and continuation lines
+- the ``aid`` option goes with the first prompt and command end only
+- features costing more than ``MAX_COST`` bytes per command (WezTerm's ``WEZTERM_PROG``)
+  aren't loaded
+
+The bytes saved are estimated and shown by ``term_integration_stats``.
+"""
+from xonsh.built_ins import XSH
+
+# most escape bytes per command a feature may cost in this profile
+MAX_COST = 60
+# writes averaged before deciding the terminal is slow
+SAMPLES = 8
+
+active = False
+reason = ""
+# estimated bytes not sent thanks to the profile
+saved_bytes = 0
+
+_latency_ns = 0.0
+_samples = 0
+
+
+def mode() -> str:
+    val = (XSH.env or {}).get("XONTRIB_TERM_INTEGRATIONS_LOW_BANDWIDTH", "auto")
+    if isinstance(val, str):
+        val = val.lower()
+        if val in {"on", "true", "1", "yes"}:
+            return "on"
+        if val in {"off", "false", "0", "no"}:
+            return "off"
+        return "auto"
+    return "on" if val else "off"
+
+
+def decide() -> bool:
+    """whether the session starts with the profile, checked once at load"""
+    global active, reason
+    current = mode()
+    if current == "on":
+        active, reason = True, "forced"
+    elif current == "auto" and (XSH.env or {}).get("SSH_CONNECTION"):
+        active, reason = True, "ssh"
+    return active
+
+
+def watch_latency():
+    """turn the profile on later if writes to the terminal are slow"""
+    from . import utils
+
+    if not active and mode() == "auto":
+        utils.write_monitor = record_write
+
+
+def record_write(took_ns: int):
+    """moving average of the write+flush latency (``utils.write_to_out``)"""
+    global _latency_ns, _samples
+    _samples += 1
+    _latency_ns += (took_ns - _latency_ns) / min(_samples, SAMPLES)
+    if _samples < SAMPLES:
+        return
+    slow_ms = float(XSH.env.get("XONTRIB_TERM_INTEGRATIONS_SLOW_WRITE_MS", 20))
+    if _latency_ns > slow_ms * 1_000_000:
+        activate("latency")
+
+
+def activate(why: str):
+    global active, reason
+    from . import registry, utils
+
+    utils.write_monitor = None
+    if active:
+        return
+    active, reason = True, why
+    registry.apply_low_bandwidth()
+
+
+def report() -> dict:
+    return {
+        "active": active,
+        "reason": reason,
+        "saved_bytes": saved_bytes,
+        "write_latency_ms": round(_latency_ns / 1_000_000, 3),
+    }
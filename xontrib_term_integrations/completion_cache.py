@@ -0,0 +1,125 @@
+"""Bounded memoization of kitty completion results.
+
+Results are stored per context (kitty binary, cwd, preceding tokens) and prefix.
+A longer prefix is answered by narrowing the sorted result of a shorter cached prefix,
+so typing ``kitty --d``, ``--de``, ``--deb`` spawns the completer only once.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from xonsh.built_ins import XSH
+
+# narrowing across these would need a different listing (values, sub-directories)
+_BOUNDARIES = ("=", os.sep)
+
+
+class CacheEntry:
+    __slots__ = ("stamp", "lines", "complete")
+
+    def __init__(self, lines: List[str], complete: bool):
+        self.stamp = time.monotonic()
+        self.lines = lines
+        # False when the candidates were capped, such entries can't be narrowed
+        self.complete = complete
+
+
+class CompletionCache:
+    def __init__(self):
+        self.entries: "OrderedDict[Tuple[tuple, str], CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.narrowed = 0
+        self.misses = 0
+        self.evictions = 0
+        # filled from the background completion thread as well
+        self.lock = threading.Lock()
+
+    @property
+    def max_entries(self) -> int:
+        return int(XSH.env.get("XONTRIB_TERM_INTEGRATIONS_COMPLETION_CACHE_SIZE", 256))
+
+    @property
+    def ttl(self) -> float:
+        return float(XSH.env.get("XONTRIB_TERM_INTEGRATIONS_COMPLETION_CACHE_TTL", 300))
+
+    def _fresh(self, entry: CacheEntry, allow_stale: bool):
+        return allow_stale or (time.monotonic() - entry.stamp) < self.ttl
+
+    def get(self, ctx: tuple, prefix: str, allow_stale=False) -> Optional[List[str]]:
+        """cached lines completing ``prefix`` in ``ctx``, None on a miss.
+
+        ``allow_stale`` ignores the TTL, useful when the alternative is to block.
+        """
+        with self.lock:
+            return self._get(ctx, prefix, allow_stale)
+
+    def _get(self, ctx: tuple, prefix: str, allow_stale: bool):
+        # an empty prefix lists a different kind of candidates (paths vs options)
+        # so it is never used to narrow
+        for idx in range(len(prefix), min(len(prefix), 1) - 1, -1):
+            if idx < len(prefix) and prefix[idx] in _BOUNDARIES:
+                break
+            key = (ctx, prefix[:idx])
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            if not self._fresh(entry, allow_stale):
+                # kept around until evicted, still good enough when not blocking
+                continue
+            if idx < len(prefix) and not entry.complete:
+                continue
+            self.entries.move_to_end(key)
+            if idx == len(prefix):
+                self.hits += 1
+                return entry.lines
+            self.narrowed += 1
+            return narrow(entry.lines, prefix)
+        self.misses += 1
+        return None
+
+    def put(self, ctx: tuple, prefix: str, lines: List[str], complete=True):
+        key = (ctx, prefix)
+        entry = CacheEntry(sorted(lines), complete)
+        max_entries = self.max_entries
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        self.hits = self.narrowed = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "narrowed": self.narrowed,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def can_narrow(shorter: str, prefix: str) -> bool:
+    """whether the candidates of ``prefix`` are a subset of the ``shorter`` one's"""
+    return prefix.startswith(shorter) and not any(
+        sep in prefix[len(shorter) :] for sep in _BOUNDARIES
+    )
+
+
+def narrow(lines: List[str], prefix: str) -> List[str]:
+    """lines of the sorted list that start with the prefix"""
+    start = bisect.bisect_left(lines, prefix)
+    end = start
+    while end < len(lines) and lines[end].startswith(prefix):
+        end += 1
+    return lines[start:end]
+
+
+cache = CompletionCache()
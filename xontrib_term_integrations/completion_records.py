@@ -0,0 +1,72 @@
+"""Compact, reusable records of kitty's completion vocabulary.
+
+The same option and sub-command lines come back on every <Tab>. Each distinct line
+is parsed once per kitty binary into a ``__slots__`` record with interned strings,
+and its ``RichCompletion`` is built once, so a completion request only looks
+records up instead of splitting, stripping and allocating for every candidate.
+"""
+import os
+import sys
+from typing import Dict, Optional
+
+from xonsh.completers.tools import RichCompletion
+
+# lines kept per kitty binary. Paths and other dynamic candidates are unbounded,
+# the table starts over once it is full.
+MAX_RECORDS = 8192
+
+
+class CompletionRecord:
+    __slots__ = ("cmd", "desc", "is_dir", "_spaced", "_plain")
+
+    def __init__(self, line: str):
+        cmd, _, desc = line.strip().partition("\t")
+        self.cmd = sys.intern(cmd.strip())
+        self.desc = sys.intern(desc.strip())
+        # path completions don't get a space even if it is a single candidate
+        self.is_dir = self.cmd.endswith(os.sep)
+        self._spaced: Optional[RichCompletion] = None
+        self._plain: Optional[RichCompletion] = None
+
+    def completion(self, append_space=False) -> RichCompletion:
+        if append_space and not self.is_dir:
+            if self._spaced is None:
+                self._spaced = RichCompletion(
+                    self.cmd, description=self.desc, append_space=True
+                )
+            return self._spaced
+        if self._plain is None:
+            self._plain = RichCompletion(
+                self.cmd, description=self.desc, append_space=False
+            )
+        return self._plain
+
+
+class RecordTable:
+    def __init__(self):
+        self.records: Dict[str, CompletionRecord] = {}
+
+    def get(self, line: str) -> CompletionRecord:
+        rec = self.records.get(line)
+        if rec is None:
+            if len(self.records) >= MAX_RECORDS:
+                self.records.clear()
+            rec = self.records[line] = CompletionRecord(line)
+        return rec
+
+    def __len__(self):
+        return len(self.records)
+
+
+_tables: Dict[object, RecordTable] = {}
+
+
+def table_for(binary) -> RecordTable:
+    """the record table of a kitty binary
+    (path and mtime, see ``kitty_worker.binary_key``)"""
+    table = _tables.get(binary)
+    if table is None:
+        # a new kitty build replaces the vocabulary of the old one
+        _tables.clear()
+        table = _tables[binary] = RecordTable()
+    return table
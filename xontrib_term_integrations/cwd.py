@@ -0,0 +1,46 @@
+"""Reports the working directory to the terminal, once per prompt or command.
+
+``on_chdir`` only remembers the new directory. The last one is sent right before
+the next prompt or command, so scripts that ``cd``/``pushd``/``popd`` in a loop
+cost a single sequence instead of one flushed write per change.
+"""
+from typing import Callable, Optional
+
+from xonsh.built_ins import XSH
+
+from . import stats, utils
+
+_pending: Optional[str] = None
+_sent: Optional[str] = None
+_report: Optional[Callable[[str], None]] = None
+
+
+def report_osc7(newdir: str):
+    utils.write_osc7_cwd(XSH.env.get("HOSTNAME", ""), newdir)
+
+
+def report_osc1337(newdir: str):
+    utils.write_osc_cwd(newdir)
+
+
+@stats.hook
+def onchdir(olddir, newdir, **_):
+    global _pending
+    _pending = newdir
+
+
+@stats.hook
+def flush_cwd(**_):
+    global _pending, _sent
+    newdir, _pending = _pending, None
+    # cd-ing back to where the terminal already is
+    if newdir is not None and newdir != _sent:
+        _report(newdir)
+        _sent = newdir
+
+
+def set_report(report: Callable[[str], None]):
+    """report the cwd with ``report`` (``report_osc7`` or ``report_osc1337``),
+    ``registry`` hooks up ``onchdir`` and ``flush_cwd``"""
+    global _report
+    _report = report
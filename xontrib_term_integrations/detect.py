@@ -0,0 +1,85 @@
+"""Detects the terminal emulator and the shell integration features it supports."""
+import os
+from typing import NamedTuple, Optional
+
+
+class Capabilities(NamedTuple):
+    backend: str  # kitty, wezterm, iterm2 or empty when integration is unwanted
+    semantic_zones: bool = False  # OSC 133 prompt/input/output marks
+    zone_options: bool = False  # OSC 133 aid/cl options and right/secondary prompts
+    cwd_osc7: bool = False  # OSC 7 file:// URL
+    cwd_osc1337: bool = False  # OSC 1337 CurrentDir
+    user_vars: bool = False  # OSC 1337 SetUserVar
+    pane_vars: bool = False  # WEZTERM_PROG/USER/HOST/IN_TMUX user vars on every prompt
+    remote_host: bool = False  # OSC 1337 RemoteHost and ShellIntegrationVersion
+    kitty_completions: bool = False  # kitty +complete
+    tmux_passthrough: bool = False  # sequences need the tmux DCS wrapper
+
+
+def in_tmux() -> bool:
+    return bool(os.getenv("TMUX"))
+
+
+def _terminal_env():
+    return (
+        os.getenv("TERM", "").lower(),
+        os.getenv("TERM_PROGRAM", "").lower(),
+        os.getenv("TERMINFO", "").lower(),
+        in_tmux(),
+    )
+
+
+def for_backend(backend: str, tmux=False) -> Capabilities:
+    """what the integration of ``backend`` (kitty, wezterm or iterm2) uses"""
+    if backend == "kitty":
+        return Capabilities(
+            backend="kitty",
+            semantic_zones=True,
+            cwd_osc7=True,
+            kitty_completions=True,
+            tmux_passthrough=tmux,
+        )
+    if backend == "wezterm":
+        return Capabilities(
+            backend="wezterm",
+            semantic_zones=True,
+            zone_options=True,
+            cwd_osc7=True,
+            user_vars=True,
+            pane_vars=True,
+            tmux_passthrough=tmux,
+        )
+    return Capabilities(
+        backend="iterm2",
+        semantic_zones=True,
+        cwd_osc1337=True,
+        user_vars=True,
+        remote_host=True,
+        tmux_passthrough=tmux,
+    )
+
+
+def probe(term: str, term_program: str, terminfo: str, tmux: bool) -> Capabilities:
+    # avoid terminals that don't like OSC sequences
+    if term in {"dumb", "linux"}:
+        return Capabilities(backend="")
+    if ("kitty" in terminfo) or ("kitty" in term):
+        return for_backend("kitty", tmux)
+    if ("wezterm" in terminfo) or ("wezterm" in term) or ("wezterm" in term_program):
+        # todo: fails in a root shell https://github.com/wez/wezterm/issues/3114
+        return for_backend("wezterm", tmux)
+    # fallback
+    # if "iTerm" in os.getenv("TERM_PROGRAM", ""):
+    return for_backend("iterm2", tmux)
+
+
+_capabilities: Optional[Capabilities] = None
+
+
+def capabilities(refresh=False) -> Capabilities:
+    """capabilities of the current terminal, detected once per session.
+    Only a few environment lookups: cheaper than any cache stored on disk."""
+    global _capabilities
+    if _capabilities is None or refresh:
+        _capabilities = probe(*_terminal_env())
+    return _capabilities
@@ -0,0 +1,49 @@
+"""User and host name of the session, resolved once in-process (no ``id``/``hostname``
+forks). Call ``refresh`` in the rare case the hostname changes during a session."""
+import contextlib
+import getpass
+import os
+import socket
+from typing import Optional, Tuple
+
+from xonsh.built_ins import XSH
+
+_identity: Optional[Tuple[str, str]] = None
+
+
+def _prompt_field(name: str) -> str:
+    fields = (XSH.env or {}).get("PROMPT_FIELDS", {})
+    val = fields[name] if name in fields else None
+    return val if isinstance(val, str) else ""
+
+
+def _resolve_user() -> str:
+    if user := _prompt_field("user"):
+        return user
+    # same as `id -un`
+    with contextlib.suppress(ImportError, KeyError):
+        import pwd
+
+        return pwd.getpwuid(os.geteuid()).pw_name
+    with contextlib.suppress(Exception):
+        return getpass.getuser()
+    return ""
+
+
+def _resolve_hostname() -> str:
+    if hostname := (XSH.env or {}).get("WEZTERM_HOSTNAME"):
+        return hostname
+    if hostname := _prompt_field("hostname"):
+        return hostname
+    return socket.gethostname()
+
+
+def refresh() -> Tuple[str, str]:
+    global _identity
+    _identity = (_resolve_user(), _resolve_hostname())
+    return _identity
+
+
+def get() -> Tuple[str, str]:
+    """(user, hostname) pair"""
+    return _identity or refresh()
@@ -0,0 +1,108 @@
+"""Runs kitty completion requests on a background asyncio loop.
+
+The UI thread waits only up to a timeout for the answer, and a newer request
+cancels the one still in flight (killing its ``kitty +complete`` process).
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from xonsh.built_ins import XSH
+
+from . import kitty_worker, utils
+
+# completion lines and whether they are all of kitty's candidates
+Result = Tuple[List[str], bool]
+
+
+async def spawn(exe: str, *tokens: str, limit: int) -> Optional[Result]:
+    """one-shot ``kitty +complete fish2`` process, reading the lines as they
+    arrive and stopping kitty at ``limit``"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            exe,
+            "+complete",
+            "fish2",
+            stderr=asyncio.subprocess.DEVNULL,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=utils.detyped_env(),
+        )
+    except FileNotFoundError:
+        return None
+    assert proc.stdin is not None and proc.stdout is not None
+    lines: List[str] = []
+    complete = True
+    try:
+        with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+            proc.stdin.write("\n".join(tokens).encode())
+            await proc.stdin.drain()
+            proc.stdin.close()
+        async for raw in proc.stdout:
+            line = raw.decode().rstrip("\n")
+            if not line.strip():
+                continue
+            if len(lines) >= limit:
+                complete = False
+                break
+            lines.append(line)
+    finally:
+        if proc.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                proc.kill()
+        await proc.wait()
+    return lines, complete
+
+
+def split_output(out: str, limit: int) -> Result:
+    lines = out.strip().splitlines()
+    return lines[:limit], len(lines) <= limit
+
+
+async def fetch(exe: str, *tokens: str, limit: int) -> Optional[Result]:
+    if XSH.env.get("XONTRIB_TERM_INTEGRATIONS_KITTY_WORKER", True):
+        loop = asyncio.get_running_loop()
+        # the worker answers over a pipe quickly, cancelling it only drops the answer
+        out = await loop.run_in_executor(None, kitty_worker.request, exe, *tokens)
+        if out is not None:
+            return split_output(out, limit)
+    return await spawn(exe, *tokens, limit=limit)
+
+
+class CompletionRunner:
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.current: Optional[concurrent.futures.Future] = None
+        self.lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=self.loop.run_forever, name="kitty-completions", daemon=True
+            ).start()
+        return self.loop
+
+    def submit(
+        self,
+        exe: str,
+        *tokens: str,
+        limit: int,
+        on_done: Optional[Callable] = None,
+    ) -> concurrent.futures.Future:
+        """schedule a request, cancelling the outdated one that is still running"""
+        with self.lock:
+            if self.current is not None:
+                self.current.cancel()
+            fut = asyncio.run_coroutine_threadsafe(
+                fetch(exe, *tokens, limit=limit), self._ensure_loop()
+            )
+            if on_done is not None:
+                fut.add_done_callback(on_done)
+            self.current = fut
+        return fut
+
+
+runner = CompletionRunner()
@@ -1,12 +1,19 @@
 """Completers for pip."""
+import concurrent.futures
 import contextlib
+import itertools
 import os
 import subprocess
+from typing import Optional
 
 from xonsh.built_ins import XSH
 from xonsh.completers.tools import RichCompletion, contextual_command_completer
 from xonsh.parsers.completion_context import CommandContext
 
+from . import kitty_async, kitty_index, kitty_worker, utils
+from .completion_cache import cache
+from .completion_records import RecordTable, table_for
+
 
 def create_rich_completion(line: str, append_space=False):
     line = line.strip()
@@ -17,7 +24,7 @@ def create_rich_completion(line: str, append_space=False):
 
     # special treatment for path completions.
     # not appending space even if it is a single candidate.
-    if cmd.endswith(os.pathsep):
+    if cmd.endswith(os.sep):
         append_space = False
 
     return RichCompletion(
@@ -30,16 +37,54 @@ def create_rich_completion(line: str, append_space=False):
 def generate_completions_from_string(output: str):
     """Rich completion from multi-line string, each line representing a completion."""
     if output:
-        lines = output.strip().splitlines(keepends=False)
-        # if there is a single completion candidate then maybe it is over
-        append_space = len(lines) == 1
+        yield from generate_completions_from_lines(output_lines(output))
+
+
+def output_lines(output: str):
+    return output.strip().splitlines(keepends=False) if output else []
+
+
+def completion_limit() -> int:
+    """most candidates worth reading, the menu can't show thousands anyway"""
+    return int(XSH.env.get("XONTRIB_TERM_INTEGRATIONS_COMPLETION_LIMIT", 500))
+
+
+def generate_completions_from_lines(
+    lines, limit: Optional[int] = None, table: Optional[RecordTable] = None
+):
+    """Rich completions from an iterable of lines, consumed lazily.
+    With a ``table`` the completions are shared with earlier requests."""
+    if table is None:
+        create = create_rich_completion
+    else:
+
+        def create(line, append_space=False):
+            return table.get(line).completion(append_space)
+
+    lines = iter(lines if limit is None else itertools.islice(lines, limit))
+    first = next(lines, None)
+    if first is None:
+        return
+    second = next(lines, None)
+    # if there is a single completion candidate then maybe it is over
+    yield create(first, append_space=second is None)
+    if second is not None:
+        yield create(second)
         for line in lines:
-            comp = create_rich_completion(line, append_space)
-            yield comp
+            yield create(line)
 
 
 def run_subproc(exe: str, *tokens: "str"):
-    env = XSH.env.detype()
+    if XSH.env.get("XONTRIB_TERM_INTEGRATIONS_KITTY_WORKER", True):
+        out = kitty_worker.request(exe, *tokens)
+        if out is not None:
+            return out
+    return spawn_subproc(exe, *tokens)
+
+
+def spawn_subproc(exe: str, *tokens: "str"):
+    """one-shot ``kitty +complete fish2`` process"""
+    env = utils.detyped_env()
 
     with contextlib.suppress(FileNotFoundError):
         proc = subprocess.Popen(
@@ -54,17 +99,61 @@ def run_subproc(exe: str, *tokens: "str"):
         return out
 
 
+def cache_context(*args, cwd: Optional[str] = None):
+    """key for the completion cache: kitty binary, cwd and the preceding tokens.
+    The cwd is None when it was deleted under the shell, such keys aren't cached."""
+    exe = args[0]
+    if cwd is None:
+        with contextlib.suppress(OSError):
+            cwd = os.getcwd()
+    return kitty_worker.binary_key(exe) or exe, cwd, args[1:-1]
+
+
 def get_completions(*args):
     if not args:
         return
-    exe = args[0]
-    output = run_subproc(exe, *args)
-    return generate_completions_from_string(output)
+    ctx, prefix = cache_context(*args), args[-1]
+    lines = kitty_index.lookup(ctx[0], ctx[2], prefix)
+    if lines is None and ctx[1] is not None:
+        lines = cache.get(ctx, prefix)
+    if lines is None:
+        lines = fetch_lines(ctx, prefix, *args)
+        if lines is None:
+            return
+    return generate_completions_from_lines(lines, table=table_for(ctx[0]))
+
+
+def fetch_lines(ctx: tuple, prefix: str, exe: str, *tokens: str):
+    """Ask kitty without blocking the prompt for longer than the timeout.
+
+    On timeout the request keeps running in the background and fills the cache,
+    meanwhile whatever (possibly expired) entry is cached is returned.
+    """
+
+    cached = ctx[1] is not None
+
+    def store(fut: concurrent.futures.Future):
+        if cached and not fut.cancelled() and fut.exception() is None:
+            result = fut.result()
+            if result is not None:
+                cache.put(ctx, prefix, *result)
+
+    fut = kitty_async.runner.submit(
+        exe, exe, *tokens, limit=completion_limit(), on_done=store
+    )
+    timeout = float(XSH.env.get("XONTRIB_TERM_INTEGRATIONS_COMPLETION_TIMEOUT", 1.0))
+    try:
+        result = fut.result(timeout)
+    except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+        return cache.get(ctx, prefix, allow_stale=True) if cached else None
+    if result is None:
+        return None
+    lines, _ = result
+    return lines
 
 
-@contextual_command_completer
-def xonsh_complete(ctx: CommandContext):
-    """Completes python's package manager pip."""
+def complete_command(ctx: CommandContext):
+    """Completes kitty's command line."""
     if not ctx.completing_command("kitty"):
         return None
 
@@ -76,6 +165,9 @@ def xonsh_complete(ctx: CommandContext):
     return get_completions(*tokens, ctx.prefix)
 
 
+xonsh_complete = contextual_command_completer(complete_command)
+
+
 if __name__ == "__main__":
     # small testing won't hurt
     from xonsh.main import setup
@@ -0,0 +1,151 @@
+"""On-disk index of kitty's static completions (options, sub-commands, kittens).
+
+The completion tree is crawled once per kitty build with the ``fish2`` protocol
+and stored as a marshal file keyed by the hash of the kitty binary.
+Static positions are answered from the index, anything else (paths, fonts,
+themes, option values) still goes to kitty.
+"""
+import contextlib
+import hashlib
+import marshal
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from xonsh.built_ins import XSH
+
+from .completion_cache import can_narrow, narrow
+
+# bump when the crawl or the file layout changes
+INDEX_VERSION = 1
+
+# preceding tokens -> [(seed prefix, sorted lines)]
+Index = Dict[Tuple[str, ...], List[Tuple[str, List[str]]]]
+
+
+def binary_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fr:
+        for chunk in iter(lambda: fr.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_path(digest: str) -> Optional[str]:
+    data_dir = (XSH.env or {}).get("XONSH_DATA_DIR")
+    if not data_dir:
+        return None
+    return os.path.join(
+        data_dir, "term_integration", f"kitty-{digest[:16]}-v{INDEX_VERSION}.marshal"
+    )
+
+
+def crawl(exe: str) -> Tuple[Dict[Tuple[Tuple[str, ...], str], List[str]], bool]:
+    """query the static positions of kitty's command line,
+    and whether all the queries were answered"""
+    from .kitty_completions import run_subproc
+
+    entries: Dict[Tuple[Tuple[str, ...], str], List[str]] = {}
+    complete = True
+
+    def query(preceding: Tuple[str, ...], seed: str) -> List[str]:
+        nonlocal complete
+        out = run_subproc(exe, exe, *preceding, seed)
+        if out is None:
+            # left out, kitty is asked for this position instead
+            complete = False
+            return []
+        lines = sorted(line for line in out.splitlines() if line.strip())
+        entries[(preceding, seed)] = lines
+        return [line.split("\t", 1)[0].strip() for line in lines]
+
+    query((), "-")
+    query((), "+")
+    for kitten in query(("+kitten",), ""):
+        query(("+kitten", kitten), "-")
+    for cmd in query(("@",), ""):
+        if not cmd.startswith("-"):
+            query(("@", cmd), "-")
+    return entries, complete
+
+
+def to_index(entries: dict) -> Index:
+    index: Index = {}
+    for (preceding, seed), lines in entries.items():
+        index.setdefault(preceding, []).append((seed, lines))
+    return index
+
+
+def load(path: str) -> Optional[Index]:
+    with contextlib.suppress(OSError, EOFError, ValueError, TypeError):
+        with open(path, "rb") as fr:
+            return to_index(marshal.load(fr))
+    return None
+
+
+def save(path: str, entries: dict):
+    with contextlib.suppress(OSError):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}"
+        with open(tmp, "wb") as fw:
+            marshal.dump(entries, fw)
+        os.replace(tmp, path)
+
+
+# binary key (path, mtime) -> index, None while it is being loaded/built
+_indexes: Dict[tuple, Optional[Index]] = {}
+_lock = threading.Lock()
+
+
+def _build(binary: tuple):
+    index: Index = {}
+    # e.g. an unreadable binary, the completions still work without an index
+    try:
+        path = index_path(binary_hash(binary[0]))
+        index = (load(path) if path and os.path.exists(path) else None) or {}
+        if not index:
+            entries, complete = crawl(binary[0])
+            # a partial crawl is used for this session only, the next one retries
+            if path and complete:
+                save(path, entries)
+            index = to_index(entries)
+    except (OSError, ValueError):
+        pass
+    finally:
+        # an empty index sends everything to kitty, as before
+        _indexes[binary] = index
+
+
+def ensure(binary: tuple, wait=False):
+    """start loading (or crawling) the index of a kitty binary in the background,
+    or in this thread with ``wait``"""
+    with _lock:
+        if binary in _indexes:
+            return
+        _indexes[binary] = None
+    if wait:
+        _build(binary)
+        return
+    threading.Thread(
+        target=_build, args=(binary,), name="kitty-index", daemon=True
+    ).start()
+
+
+def lookup(binary, preceding: tuple, prefix: str) -> Optional[List[str]]:
+    """lines completing a static position, None when kitty has to be asked"""
+    if not isinstance(binary, tuple) or not XSH.env.get(
+        "XONTRIB_TERM_INTEGRATIONS_KITTY_INDEX", True
+    ):
+        return None
+    index = _indexes.get(binary)
+    if index is None:
+        ensure(binary)
+        return None
+    for seed, lines in index.get(tuple(preceding), ()):
+        if seed == prefix:
+            return lines
+        # positions crawled with an empty prefix (kittens, remote control commands)
+        # list only the sub-commands, not the options
+        if (seed or not prefix.startswith("-")) and can_narrow(seed, prefix):
+            return narrow(lines, prefix)
+    return None
@@ -0,0 +1,103 @@
+"""Warms kitty completions up while the shell is idle.
+
+Started from ``on_post_init`` (and after each ``cd`` for the path completions,
+with ``$XONTRIB_TERM_INTEGRATIONS_KITTY_PREWARM_CHDIR``), a thread starts the
+worker, lowers its own priority, loads the completion index, then asks the
+common top-level queries and stores them in the completion cache, so the first
+<Tab> after ``kitty`` is answered from memory.
+Disable it with ``$XONTRIB_TERM_INTEGRATIONS_KITTY_PREWARM = False``.
+"""
+import contextlib
+import os
+import sys
+import threading
+from typing import Optional, Sequence, Tuple
+
+from xonsh.built_ins import XSH
+
+# tokens after ``kitty``, the last one being the prefix
+QUERIES: Sequence[Tuple[str, ...]] = [("-",), ("--",), ("+",), ("+kitten", "")]
+# what ``kitty <Tab>`` lists in the new directory
+CHDIR_QUERIES: Sequence[Tuple[str, ...]] = [("",)]
+
+# (cwd, queries) waiting for the thread, only the latest is kept
+_pending: Optional[Tuple[str, Sequence[Tuple[str, ...]]]] = None
+_wake = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def lower_priority():
+    """make the current thread yield to the shell (linux nices single threads)"""
+    from . import kitty_worker
+
+    if sys.platform.startswith("linux") and hasattr(threading, "get_native_id"):
+        with contextlib.suppress(OSError, AttributeError):
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+            kitty_worker.local.niced = True
+
+
+def warm(cwd: str, queries: Sequence[Tuple[str, ...]], exe="kitty"):
+    # imported here, in the background thread, to keep them off the startup path
+    from . import kitty_async, kitty_completions, kitty_index, kitty_worker
+    from .completion_cache import cache
+    from .completion_records import table_for
+
+    binary = kitty_worker.binary_key(exe)
+    if binary is None:
+        return
+    if not getattr(kitty_worker.local, "niced", False):
+        # the worker is started before the thread is niced,
+        # its processes would run at the lowered priority for the whole session
+        if XSH.env.get("XONTRIB_TERM_INTEGRATIONS_KITTY_WORKER", True):
+            kitty_worker.spawn(exe)
+        lower_priority()
+    if XSH.env.get("XONTRIB_TERM_INTEGRATIONS_KITTY_INDEX", True):
+        kitty_index.ensure(binary, wait=True)
+    table = table_for(binary)
+    for tokens in queries:
+        args = (exe, *tokens)
+        ctx, prefix = kitty_completions.cache_context(*args, cwd=cwd), args[-1]
+        lines = kitty_index.lookup(binary, ctx[2], prefix)
+        if lines is None:
+            lines = cache.get(ctx, prefix)
+        if lines is None:
+            out = kitty_completions.run_subproc(exe, *args)
+            if out is None:
+                return
+            # the user moved on, the answer may be about another directory
+            if os.getcwd() != cwd:
+                return
+            lines, complete = kitty_async.split_output(
+                out, kitty_completions.completion_limit()
+            )
+            cache.put(ctx, prefix, lines, complete)
+        # build the records (and their completions) the first <Tab> shows
+        list(kitty_completions.generate_completions_from_lines(lines, table=table))
+
+
+def _run():
+    global _pending
+    while True:
+        _wake.wait()
+        _wake.clear()
+        job, _pending = _pending, None
+        if job is not None:
+            with contextlib.suppress(OSError, ValueError):
+                warm(*job)
+
+
+def schedule(queries: Sequence[Tuple[str, ...]] = QUERIES):
+    global _pending, _thread
+    _pending = (os.getcwd(), queries)
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name="kitty-prewarm", daemon=True)
+        _thread.start()
+    _wake.set()
+
+
+def on_post_init(**_):
+    schedule(QUERIES)
+
+
+def on_chdir(**_):
+    schedule(CHDIR_QUERIES)
@@ -0,0 +1,217 @@
+"""A long-lived ``kitty +complete fish2`` worker that answers requests over a pipe."""
+import json
+import os
+import select
+import shutil
+import subprocess
+import threading
+from typing import Dict, Optional, Tuple
+
+from . import utils
+
+# runs inside kitty's own interpreter (``kitty +runpy``) and replays the
+# ``+complete fish2`` entry point for every request line it reads.
+# the worker exits by itself once the shell closes its end of the pipe.
+WORKER_CODE = r"""
+import io, json, os, sys
+from kitty.__main__ import namespaced_entry_points
+complete = namespaced_entry_points["complete"]
+inp, out = sys.stdin, sys.stdout
+out.write("ready\n")
+out.flush()
+for line in inp:
+    req = json.loads(line)
+    sys.stdin, sys.stdout = io.StringIO(req["input"]), io.StringIO()
+    ok = True
+    try:
+        if req["cwd"] is not None:
+            os.chdir(req["cwd"])
+        complete(["+complete", "fish2"])
+    except SystemExit:
+        pass
+    except Exception:
+        ok = False
+    finally:
+        buf = sys.stdout
+        sys.stdin, sys.stdout = inp, out
+    out.write(json.dumps([ok, buf.getvalue()]) + "\n")
+    out.flush()
+"""
+
+START_TIMEOUT = 5.0
+REQUEST_TIMEOUT = 2.0
+# requests failing in a row before the worker is given up on
+MAX_ERRORS = 3
+
+
+def binary_key(exe: str) -> Optional[Tuple[str, int]]:
+    """resolved path and modification time of the kitty binary.
+    A change in either means the worker is running stale code."""
+    path = shutil.which(exe, path=utils.detyped_env().get("PATH"))
+    if not path:
+        return None
+    path = os.path.realpath(path)
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _readline(proc: subprocess.Popen, timeout: float) -> Optional[bytes]:
+    assert proc.stdout is not None
+    ready, _, _ = select.select([proc.stdout], [], [], timeout)
+    if not ready:
+        return None
+    return proc.stdout.readline()
+
+
+class KittyWorker:
+    def __init__(self, key: Tuple[str, int]):
+        self.key = key
+        self.proc: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+        # set when the worker can't be used with this binary at all
+        self.failed = False
+        # requests that raised in the worker since its last answer
+        self.errors = 0
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self) -> bool:
+        self.stop()
+        try:
+            self.proc = subprocess.Popen(
+                [self.key[0], "+runpy", WORKER_CODE],
+                stderr=subprocess.DEVNULL,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                env=utils.detyped_env(),
+            )
+        except OSError:
+            self.proc = None
+            return False
+        if _readline(self.proc, START_TIMEOUT) != b"ready\n":
+            self.stop()
+            return False
+        return True
+
+    def stop(self):
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+    def _send(self, payload: bytes, timeout: float, fresh=False) -> Optional[str]:
+        proc = self.proc
+        assert proc is not None and proc.stdin is not None
+        try:
+            proc.stdin.write(payload)
+            proc.stdin.flush()
+        except OSError:
+            return None
+        line = _readline(proc, timeout)
+        if line is None and fresh:
+            # a worker that can't answer its first request never will
+            # (e.g. a ``+complete`` handing over to another program)
+            self.failed = True
+        if not line:
+            # hung or crashed mid request, the next call respawns it
+            self.stop()
+            return None
+        try:
+            ok, out = json.loads(line)
+        except (TypeError, ValueError):
+            # something else wrote to the worker's stdout, same as a crash
+            self.stop()
+            return None
+        if not ok:
+            # this request raised (e.g. a directory gone in the meantime),
+            # the caller asks a one-shot process. Failing every time means
+            # kitty's completion internals don't match what the worker expects
+            self.errors += 1
+            if self.errors >= MAX_ERRORS:
+                self.failed = True
+            return None
+        self.errors = 0
+        return out
+
+    def request(
+        self, tokens, cwd: Optional[str], timeout=REQUEST_TIMEOUT
+    ) -> Optional[str]:
+        """Returns the ``fish2`` output for the given tokens,
+        or None when the worker could not answer."""
+        payload = json.dumps({"input": "\n".join(tokens), "cwd": cwd}) + "\n"
+        with self.lock:
+            # one restart attempt if the worker crashed since the last request
+            for _ in range(2):
+                fresh = not self.alive
+                if fresh and not self.start():
+                    self.failed = True
+                    return None
+                out = self._send(payload.encode(), timeout, fresh)
+                if out is not None or self.alive or self.failed:
+                    return out
+        return None
+
+
+# by ``binary_key``: ``kitty`` and its resolved path share a worker
+_workers: Dict[Tuple[str, int], KittyWorker] = {}
+# binaries that can't run the worker (e.g. kitty builds without +runpy)
+_broken: set = set()
+# ``niced`` is set in threads running at a lowered priority (see kitty_prewarm):
+# processes inherit it from the thread forking them, so the worker answering
+# the interactive <Tab>s is never started from there
+local = threading.local()
+
+
+def get_worker(exe: str) -> Optional[KittyWorker]:
+    key = binary_key(exe)
+    if key is None or key in _broken:
+        return None
+    worker = _workers.get(key)
+    if worker is None:
+        # the binary was replaced, the workers of its old build run stale code
+        for old in [old for old in _workers if old[0] == key[0]]:
+            _workers.pop(old).stop()
+        worker = _workers[key] = KittyWorker(key)
+    return worker
+
+
+def _forget_failed(worker: KittyWorker):
+    if worker.failed:
+        # don't keep paying the spawn cost for a binary that can't run it
+        _broken.add(worker.key)
+        _workers.pop(worker.key, None)
+
+
+def spawn(exe: str) -> bool:
+    """start the session's worker for ``exe`` ahead of its first request"""
+    worker = get_worker(exe)
+    if worker is None:
+        return False
+    with worker.lock:
+        if not worker.alive and not worker.start():
+            worker.failed = True
+    _forget_failed(worker)
+    return not worker.failed
+
+
+def request(exe: str, *tokens: str) -> Optional[str]:
+    """Ask the session's worker for ``exe`` to complete the tokens."""
+    worker = get_worker(exe)
+    if worker is None:
+        return None
+    if getattr(local, "niced", False) and not worker.alive:
+        # left to the next <Tab>, the caller falls back to a one-shot process
+        return None
+    try:
+        cwd: Optional[str] = os.getcwd()
+    except OSError:
+        # deleted under the shell, the worker completes in its own directory
+        cwd = None
+    out = worker.request(tokens, cwd)
+    _forget_failed(worker)
+    return out
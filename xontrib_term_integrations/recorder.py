@@ -0,0 +1,314 @@
+"""Records the escape traffic of a session for offline analysis.
+
+Set ``$XONTRIB_TERM_INTEGRATIONS_RECORD`` to a file path before loading the xontrib.
+Every write to the terminal, and the sequences embedded in the rendered prompts,
+is appended to it as a JSON line
+``{"s": seq, "t": ns, "h": hook, "n": bytes, "d": data}``,
+and the duration of every hook as ``{"s": seq, "t": ns, "h": hook, "ns": took}``
+(``t`` counts from the start of the recording).
+
+    python -m xontrib_term_integrations.recorder analyze session.jsonl
+    python -m xontrib_term_integrations.recorder replay session.jsonl [-v]
+
+The log holds what the terminal is told: working directories and, with WezTerm,
+the commands that were run.
+"""
+import argparse
+import base64
+import binascii
+import collections
+import json
+import math
+import sys
+import time
+import urllib.parse
+from typing import Counter, Dict, Iterator, List, Optional, Sequence, TextIO
+
+ESC = "\x1b"
+BEL = "\x07"
+ST = ESC + "\\"
+
+_out: Optional[TextIO] = None
+_start = 0
+_seq = 0
+
+
+def start(path: str):
+    """append everything written to the terminal to ``path``"""
+    global _out, _start
+    from . import utils
+
+    # line buffered: a crashed session still leaves a usable log
+    _out = open(path, "a", buffering=1, encoding="utf-8")
+    _start = time.perf_counter_ns()
+    utils.record = record
+
+
+def stop():
+    global _out
+    from . import utils
+
+    utils.record = None
+    if _out is not None:
+        _out.close()
+        _out = None
+
+
+def _log(entry: dict):
+    global _seq
+    _seq += 1
+    entry["s"] = _seq
+    entry["t"] = time.perf_counter_ns() - _start
+    assert _out is not None
+    _out.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def record(code: str):
+    """log a write to the terminal (``utils.write_to_out``)"""
+    from . import utils
+
+    _log({"h": utils.current_hook, "n": len(code.encode()), "d": code})
+
+
+def record_prompt(hook: str, prompt: str):
+    """log the sequences of a rendered prompt, without the prompt's own text"""
+    codes = "".join(part.partition("\002")[0] for part in prompt.split("\001")[1:])
+    _log({"h": hook, "n": len(codes.encode()), "d": codes})
+
+
+def record_hook(hook: str, took_ns: int):
+    _log({"h": hook, "ns": took_ns})
+
+
+def read_log(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as fp:
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+
+
+class FakeTerminal:
+    """parses the recorded traffic like a terminal would, keeping the state
+    the integrations are meant to set"""
+
+    def __init__(self):
+        self.cwd = ""
+        self.remote_host = ""
+        self.user_vars: Dict[str, str] = {}
+        self.marks: List[str] = []
+        self.counts: Counter[str] = collections.Counter()
+        self.malformed = 0
+
+    def feed(self, data: str) -> List[str]:
+        """the sequences found in ``data``"""
+        found = self._parse(data)
+        for label in found:
+            self.counts[label] += 1
+        return found
+
+    def _parse(self, data: str) -> List[str]:
+        found = []
+        pos = data.find(ESC)
+        while pos != -1:
+            kind = data[pos + 1 : pos + 2]
+            if kind == "]":
+                end, body = self._osc_end(data, pos + 2)
+                if end == -1:
+                    self.malformed += 1
+                    break
+                found.append(self.osc(body))
+            elif kind == "P":
+                end, body = self._dcs_end(data, pos + 2)
+                if end == -1:
+                    self.malformed += 1
+                    break
+                if body.startswith("tmux;"):
+                    found.extend(self._parse(body[5:].replace(ESC + ESC, ESC)))
+                else:
+                    found.append("dcs")
+            else:
+                end = pos + 2
+                found.append("esc")
+            pos = data.find(ESC, end)
+        return found
+
+    @staticmethod
+    def _osc_end(data: str, start: int):
+        bel, st = data.find(BEL, start), data.find(ST, start)
+        if bel != -1 and (st == -1 or bel < st):
+            return bel + 1, data[start:bel]
+        if st != -1:
+            return st + 2, data[start:st]
+        return -1, ""
+
+    @staticmethod
+    def _dcs_end(data: str, start: int):
+        pos = data.find(ESC, start)
+        while pos != -1:
+            nxt = data[pos + 1 : pos + 2]
+            if nxt == "\\":
+                return pos + 2, data[start:pos]
+            # doubled ESC of a passthrough payload
+            pos = data.find(ESC, pos + (2 if nxt == ESC else 1))
+        return -1, ""
+
+    def osc(self, body: str) -> str:
+        num, _, arg = body.partition(";")
+        if num == "133":
+            self.marks.append(arg[:1])
+            return f"133;{arg[:1]}"
+        if num == "7":
+            self.cwd = urllib.parse.unquote(urllib.parse.urlparse(arg).path)
+            return "7"
+        if num == "1337":
+            key, _, val = arg.partition("=")
+            if key == "CurrentDir":
+                self.cwd = val
+            elif key == "RemoteHost":
+                self.remote_host = val
+            elif key == "SetUserVar":
+                name, _, b64 = val.partition("=")
+                try:
+                    self.user_vars[name] = base64.b64decode(b64).decode()
+                except (binascii.Error, UnicodeDecodeError):
+                    self.malformed += 1
+            return f"1337;{key}"
+        return f"osc {num}"
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    # nearest rank, like ``stats.HookStats.percentile``
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct * len(ordered)) - 1)] if ordered else 0
+
+
+def analyze(entries: List[dict]) -> dict:
+    term = FakeTerminal()
+    # bytes sent from one primary prompt to the next
+    prompt_bytes: List[int] = []
+    # sequences sent from one command's start (133;C) to the next
+    cmd_sequences: List[int] = []
+    hook_ns: Dict[str, List[int]] = collections.defaultdict(list)
+    hook_bytes: Dict[str, int] = collections.Counter()
+    for entry in entries:
+        hook = entry.get("h") or "-"
+        if "ns" in entry:
+            hook_ns[hook].append(entry["ns"])
+            continue
+        if hook == "render_prompt":
+            prompt_bytes.append(0)
+        if prompt_bytes:
+            prompt_bytes[-1] += entry["n"]
+        hook_bytes[hook] += entry["n"]
+        for label in term.feed(entry["d"]):
+            if label == "133;C":
+                cmd_sequences.append(0)
+            if cmd_sequences:
+                cmd_sequences[-1] += 1
+
+    def summary(values):
+        return {
+            "count": len(values),
+            "avg": sum(values) / len(values) if values else 0,
+            "p50": percentile(values, 0.5),
+            "max": max(values, default=0),
+        }
+
+    hooks = {
+        name: {
+            "calls": len(took),
+            "avg_us": sum(took) / len(took) / 1000,
+            "p99_us": percentile(took, 0.99) / 1000,
+            "max_us": max(took) / 1000,
+            "bytes": hook_bytes.get(name, 0),
+        }
+        for name, took in hook_ns.items()
+    }
+    return {
+        "records": len(entries),
+        "bytes": sum(entry.get("n", 0) for entry in entries),
+        "seconds": entries[-1]["t"] / 1e9 if entries else 0,
+        "bytes_per_prompt": summary(prompt_bytes),
+        "sequences_per_command": summary(cmd_sequences),
+        "sequences": dict(term.counts.most_common()),
+        "malformed": term.malformed,
+        "slowest_hooks": dict(
+            sorted(hooks.items(), key=lambda item: -item[1]["p99_us"])
+        ),
+    }
+
+
+def format_analysis(data: dict, top: int) -> str:
+    lines = [
+        f"records: {data['records']}, bytes: {data['bytes']}, "
+        f"over {data['seconds']:.1f}s, malformed: {data['malformed']}"
+    ]
+    for name in ("bytes_per_prompt", "sequences_per_command"):
+        row = data[name]
+        lines.append(
+            f"{name}: n={row['count']} avg={row['avg']:.1f} "
+            f"p50={row['p50']} max={row['max']}"
+        )
+    lines.append("sequences:")
+    lines.extend(
+        f"  {label:<24} {count:>7}" for label, count in data["sequences"].items()
+    )
+    lines.append(
+        f"slowest hooks:\n  {'hook':<24} {'calls':>7} {'avg us':>9} {'p99 us':>9} "
+        f"{'max us':>9} {'bytes':>9}"
+    )
+    for name, row in list(data["slowest_hooks"].items())[:top]:
+        lines.append(
+            f"  {name:<24} {row['calls']:>7} {row['avg_us']:>9.1f} "
+            f"{row['p99_us']:>9.1f} {row['max_us']:>9.1f} {row['bytes']:>9}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def replay(entries: List[dict], verbose=False, out=sys.stdout):
+    term = FakeTerminal()
+    for entry in entries:
+        if "d" not in entry:
+            continue
+        found = term.feed(entry["d"])
+        if verbose:
+            out.write(
+                f"{entry['t'] / 1e6:>12.3f}ms {entry.get('h') or '-':<24} "
+                f"{entry['n']:>6} {' '.join(found)}\n"
+            )
+    out.write(f"cwd: {term.cwd}\n")
+    if term.remote_host:
+        out.write(f"remote host: {term.remote_host}\n")
+    for name, val in sorted(term.user_vars.items()):
+        out.write(f"user var {name}: {val!r}\n")
+    out.write(f"zone marks: {''.join(term.marks[-40:])}\n")
+    out.write(f"malformed: {term.malformed}\n")
+    return term
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m xontrib_term_integrations.recorder",
+        description="inspect a log recorded with $XONTRIB_TERM_INTEGRATIONS_RECORD",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    ana = sub.add_parser("analyze", help="bytes per prompt, sequences, slowest hooks")
+    ana.add_argument("log")
+    ana.add_argument("--json", action="store_true", help="print the numbers as JSON")
+    ana.add_argument("--top", type=int, default=10, help="slowest hooks shown")
+    rep = sub.add_parser("replay", help="feed the log to a fake terminal")
+    rep.add_argument("log")
+    rep.add_argument("-v", "--verbose", action="store_true", help="list every write")
+    ns = parser.parse_args(args)
+
+    entries = list(read_log(ns.log))
+    if ns.command == "replay":
+        replay(entries, verbose=ns.verbose)
+    elif ns.json:
+        print(json.dumps(analyze(entries), indent=2))
+    else:
+        sys.stdout.write(format_analysis(analyze(entries), ns.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+"""The integration features, loaded by what the terminal supports.
+
+Each feature (semantic zones, cwd, user vars, ...) is a unit with a rough cost
+(escape bytes sent per command) and a ``load(caps)`` registering its hooks.
+A session loads every feature its ``detect.Capabilities`` allow, once, and the
+callbacks of all features for the same event run from a single batched handler.
+
+Features can be skipped with ``$XONTRIB_TERM_INTEGRATIONS_SKIP_FEATURES``
+(e.g. ``["cwd", "pane_vars"]``) and WezTerm's own variables:
+
+- ``$WEZTERM_SHELL_SKIP_ALL``: all
+- ``$WEZTERM_SHELL_SKIP_SEMANTIC_ZONES``: ``semantic_zones``
+- ``$WEZTERM_SHELL_SKIP_CWD``: ``cwd``
+- ``$WEZTERM_SHELL_SKIP_USER_VARS``: ``pane_vars`` (which takes ``pane_prog`` along)
+"""
+import os
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from xonsh.built_ins import XSH
+from xonsh.completers.tools import contextual_command_completer
+from xonsh.tools import print_exception
+
+from . import bandwidth, cwd, identity, semantic_prompt, stats, timing, tmux, utils
+from .detect import Capabilities
+
+
+class Feature(NamedTuple):
+    name: str
+    cost: int  # rough escape bytes per command, 0 when sent only on demand
+    supported: Callable[[Capabilities], bool]
+    load: Callable[[Capabilities], None]
+
+
+# in load order
+FEATURES: Dict[str, Feature] = {}
+loaded: List[str] = []
+
+# callbacks of the loaded features per xonsh event, see ``on``
+_callbacks: Dict[str, List[Callable]] = {}
+# (event, callback) pairs added by each feature, see ``unload``
+_owned: Dict[str, List[Tuple[str, Callable]]] = {}
+_loading: Optional[str] = None
+# what to do when a loaded feature is removed, see ``on_unload``
+_unloaders: Dict[str, Callable[[], None]] = {}
+
+
+def feature(name: str, cost: int, supported: Callable[[Capabilities], bool]):
+    """decorator registering the ``load`` function of a feature"""
+
+    def decorator(load):
+        FEATURES[name] = Feature(name, cost, supported, load)
+        return load
+
+    return decorator
+
+
+def on(event: str):
+    """decorator adding a callback to the single handler of the xonsh ``event``"""
+
+    def decorator(func):
+        if event not in _callbacks:
+            callbacks = _callbacks[event] = []
+
+            def dispatch(**kwargs):
+                # a copy, ``unload`` may run from a write of a callback
+                for callback in list(callbacks):
+                    # isolated like separate xonsh handlers: a failing callback
+                    # (e.g. flush_cwd) doesn't keep the others (133;C) from running
+                    try:
+                        callback(**kwargs)
+                    except Exception:
+                        print_exception(f"Exception raised in {callback.__name__}")
+
+            dispatch.__name__ = f"term_integration_{event}"
+            # timed (and its writes attributed) as the ``<event>`` hook
+            handler = stats.instrument(event)(utils.batched(dispatch))
+            getattr(XSH.builtins.events, event)(handler)
+        _callbacks[event].append(func)
+        if _loading is not None:
+            _owned.setdefault(_loading, []).append((event, func))
+        return func
+
+    return decorator
+
+
+def on_unload(func):
+    """decorator run when the feature being loaded is removed by ``unload``"""
+    _unloaders[_loading] = func
+    return func
+
+
+def skipped() -> Set[str]:
+    env = XSH.env or {}
+    if env.get("WEZTERM_SHELL_SKIP_ALL", False):
+        return set(FEATURES)
+    names = env.get("XONTRIB_TERM_INTEGRATIONS_SKIP_FEATURES", [])
+    if isinstance(names, str):
+        names = names.replace(",", " ").split()
+    names = set(names)
+    for var, name in [
+        ("WEZTERM_SHELL_SKIP_SEMANTIC_ZONES", "semantic_zones"),
+        ("WEZTERM_SHELL_SKIP_CWD", "cwd"),
+        ("WEZTERM_SHELL_SKIP_USER_VARS", "pane_vars"),
+    ]:
+        if env.get(var, False):
+            names.add(name)
+    if "pane_vars" in names:
+        names.add("pane_prog")
+    return names
+
+
+def affordable(feat: Feature) -> bool:
+    return not bandwidth.active or feat.cost <= bandwidth.MAX_COST
+
+
+def select(caps: Capabilities) -> List[Feature]:
+    """the features the terminal supports and the user didn't turn off"""
+    skip = skipped()
+    return [
+        feat
+        for feat in FEATURES.values()
+        if feat.name not in skip and feat.supported(caps)
+    ]
+
+
+def load(caps: Capabilities) -> List[str]:
+    """load the features selected for ``caps``, each once per session"""
+    global _loading, _saved_per_command
+    for feat in select(caps):
+        if feat.name in loaded:
+            continue
+        if not affordable(feat):
+            _saved_per_command += feat.cost
+            continue
+        _loading = feat.name
+        try:
+            feat.load(caps)
+        finally:
+            _loading = None
+        loaded.append(feat.name)
+    if bandwidth.active:
+        _low_bandwidth_hooks()
+    return loaded
+
+
+def start(caps: Capabilities) -> List[str]:
+    """set the session up for ``caps``: tmux passthrough, the low-bandwidth
+    profile and the features"""
+    if caps.tmux_passthrough:
+        tmux.start()
+    bandwidth.decide()
+    load(caps)
+    bandwidth.watch_latency()
+    return loaded
+
+
+def unload(name: str):
+    """remove the event callbacks of a loaded feature"""
+    for event, func in _owned.pop(name, []):
+        _callbacks[event].remove(func)
+    if name in _unloaders:
+        _unloaders.pop(name)()
+    if name in loaded:
+        loaded.remove(name)
+
+
+def _skip_alias() -> bool:
+    return (XSH.env or {}).get("XONTRIB_TERM_INTEGRATIONS_SKIP_ALIAS", False)
+
+
+# remote host
+
+
+@feature("remote_host", cost=0, supported=lambda caps: caps.remote_host)
+def load_remote_host(caps: Capabilities):
+    on("on_post_init")(announce_host)
+
+
+@stats.hook
+def announce_host(**_):
+    utils.write_osc_shell_integration()
+    utils.write_osc_user_host(XSH.env or {})
+
+
+# cwd
+
+
+@feature("cwd", cost=40, supported=lambda caps: caps.cwd_osc7 or caps.cwd_osc1337)
+def load_cwd(caps: Capabilities):
+    cwd.set_report(cwd.report_osc7 if caps.cwd_osc7 else cwd.report_osc1337)
+    on("on_chdir")(cwd.onchdir)
+    on("on_pre_prompt")(cwd.flush_cwd)
+    on("on_precommand")(cwd.flush_cwd)
+
+
+# command duration, before the zones so that their 133;D mark carries it
+
+
+@feature(
+    "cmd_duration",
+    cost=20,
+    supported=lambda caps: (caps.semantic_zones or caps.user_vars)
+    and (XSH.env or {}).get("XONTRIB_TERM_INTEGRATIONS_CMD_DURATION", False),
+)
+def load_cmd_duration(caps: Capabilities):
+    timing.record = timing.CommandTiming(
+        cpu=XSH.env.get("XONTRIB_TERM_INTEGRATIONS_CMD_CPU_TIME", False)
+    )
+    on("on_precommand")(cmd_timing_start)
+    on("on_postcommand")(cmd_timing_stop)
+    if caps.user_vars:
+        on("on_postcommand")(cmd_duration_user_var)
+
+
+def cmd_timing_start(**_):
+    timing.record.start()
+
+
+def cmd_timing_stop(**_):
+    timing.record.stop()
+
+
+@stats.hook
+def cmd_duration_user_var(**_):
+    utils.update_user_var("CMD_DURATION_MS", timing.record.dur_ms)
+
+
+# semantic zones
+
+PROMPTS = ["PROMPT", "RIGHT_PROMPT", "BOTTOM_TOOLBAR", "MULTILINE_PROMPT"]
+
+# the wrapped $PROMPT, its ``aid`` is dropped in the low-bandwidth profile
+_primary: Optional[semantic_prompt.ShellIntegrationPrompt] = None
+# prompt name -> (what was installed, the user's value) for the marks
+# the low-bandwidth profile leaves out
+_optional_prompts: Dict[str, Tuple[object, object]] = {}
+
+
+def ps2_multiline_prompt():
+    """a callable that prints out OSC tokens as well"""
+    utils.write_term_mark("A;k=s")
+    return "."
+
+
+@feature("semantic_zones", cost=60, supported=lambda caps: caps.semantic_zones)
+def load_semantic_zones(caps: Capabilities):
+    env = XSH.env
+    global _primary
+    if caps.zone_options:
+        # every prompt kind is marked, the command's zones carry the shell's pid
+        on("on_precommand")(zone_cmd_start)
+        on("on_postcommand")(zone_cmd_end_aid)
+        opt = {"cl": "m", "aid": os.getpid()}
+        for name in PROMPTS:
+            if not env[name]:
+                continue
+            if name != "PROMPT" and bandwidth.active:
+                _skip_prompt_marks(name)
+                continue
+            user_value = env[name]
+            prompt = semantic_prompt.wrap_prompt(
+                env, prompt_name=name, extend=True, ext_opt=opt
+            )
+            if name == "PROMPT":
+                _primary = prompt
+            else:
+                _optional_prompts[name] = env[name], user_value
+        return
+    on("on_precommand")(zone_cmd_start)
+    on("on_postcommand")(zone_cmd_end)
+    semantic_prompt.wrap_prompt(env)
+    if caps.backend == "kitty" and not bandwidth.active:
+        _optional_prompts["MULTILINE_PROMPT"] = (
+            ps2_multiline_prompt,
+            env["MULTILINE_PROMPT"],
+        )
+        env["MULTILINE_PROMPT"] = ps2_multiline_prompt
+
+
+@stats.hook
+def zone_cmd_start(**_):
+    """write before starting to print out the output from the command"""
+    utils.write_osc_output_prefix()
+
+
+@stats.hook
+def zone_cmd_end(rtn=0, **_):
+    # Inform the terminal of command success/failure here
+    # (and of its duration with the cmd_duration feature)
+    utils.write_osc_cmd_status(f"{rtn}{timing.record.opts}")
+
+
+_end_aid_sent = False
+
+
+@stats.hook
+def zone_cmd_end_aid(rtn=0, **_):
+    global _end_aid_sent
+    opt = {f"{rtn}{timing.record.opts}": None}
+    if bandwidth.active and _end_aid_sent:
+        bandwidth.saved_bytes += len(aid_option())
+    else:
+        opt["aid"] = os.getpid()
+        _end_aid_sent = True
+    semantic_prompt.write_cmd_end(opt)
+
+
+# user vars
+
+
+@feature("user_vars", cost=0, supported=lambda caps: caps.user_vars)
+def load_user_vars(caps: Capabilities):
+    if not _skip_alias():
+        XSH.aliases["set_user_var"] = utils.LazyAlias("set_user_var_alias")
+        XSH.aliases["resync_user_vars"] = utils.LazyAlias("resync_user_vars_alias")
+
+
+# WEZTERM_PROG changes with every command, the other pane vars are sent once
+# (and again only when they change) and so cost nothing per command
+
+
+@feature("pane_prog", cost=80, supported=lambda caps: caps.pane_vars)
+def load_pane_prog(caps: Capabilities):
+    on("on_precommand")(pane_prog_cmd_start)
+    on("on_pre_prompt")(clear_prog)
+    on_unload(unload_pane_prog)
+
+
+@stats.hook
+def pane_prog_cmd_start(cmd="", **_):
+    # tell WezTerm the full command that is being run
+    utils.update_user_var("WEZTERM_PROG", cmd)
+
+
+@stats.hook
+def clear_prog(**_):
+    # tell WezTerm that no command is being run
+    # (a no-op once cleared, see ``utils.update_user_var``)
+    utils.update_user_var("WEZTERM_PROG", "")
+
+
+def unload_pane_prog():
+    # e.g. by the low-bandwidth profile while a command runs: WezTerm would show
+    # it as running for the rest of the session without a last WEZTERM_PROG=""
+    on("on_pre_prompt")(clear_prog)
+
+
+@feature("pane_vars", cost=0, supported=lambda caps: caps.pane_vars)
+def load_pane_vars(caps: Capabilities):
+    identity.refresh()
+    on("on_pre_prompt")(pane_vars_prompt)
+    XSH.builtins.events.on_envvar_change(identity_change)
+    XSH.builtins.events.on_envvar_new(identity_change)
+    if not _skip_alias():
+        XSH.aliases["set_wezterm_user_var"] = utils.LazyAlias(
+            "set_wezterm_user_var_alias"
+        )
+
+
+@stats.hook
+def pane_vars_prompt(**_):
+    # 1 tell WezTerm the username and 2 the hostname
+    # (resolved once for the session, see identity.refresh)
+    user, hostname = identity.get()
+    utils.update_user_var("WEZTERM_USER", user)
+    utils.update_user_var("WEZTERM_HOST", hostname)
+
+    # 3 tell WezTerm whether the pane is running inside tmux
+    utils.update_user_var("WEZTERM_IN_TMUX", "1" if XSH.env.get("TMUX", "") else "0")
+
+
+def identity_change(name, **_):
+    if name in {"WEZTERM_HOSTNAME", "PROMPT_FIELDS"}:
+        identity.refresh()
+
+
+# kitty completions
+
+
+@contextual_command_completer
+def complete_kitty(ctx):
+    """Completes kitty, importing the completion machinery on first use."""
+    if not ctx.completing_command("kitty"):
+        return None
+    from . import kitty_completions
+
+    return kitty_completions.complete_command(ctx)
+
+
+@feature("kitty_completions", cost=0, supported=lambda caps: caps.kitty_completions)
+def load_kitty_completions(caps: Capabilities):
+    from xonsh.completers.completer import add_one_completer
+
+    add_one_completer("kitty", complete_kitty, loc="<import")
+    env = XSH.env or {}
+    if env.get("XONTRIB_TERM_INTEGRATIONS_KITTY_PREWARM", True):
+        from . import kitty_prewarm
+
+        on("on_post_init")(kitty_prewarm.on_post_init)
+        if env.get("XONTRIB_TERM_INTEGRATIONS_KITTY_PREWARM_CHDIR", False):
+            on("on_chdir")(kitty_prewarm.on_chdir)
+    if not _skip_alias():
+        XSH.aliases["kitty_completion_stats"] = utils.LazyAlias(
+            "completion_stats_alias"
+        )
+
+
+# low-bandwidth profile, see ``bandwidth``
+
+# estimated bytes per prompt and per command the profile leaves out
+_saved_per_prompt = 0
+_saved_per_command = 0
+_aid_dropped = False
+_low_bandwidth_hooked = False
+
+
+def aid_option() -> str:
+    return f";aid={os.getpid()}"
+
+
+def _skip_prompt_marks(name: str):
+    global _saved_per_prompt
+    if name == "RIGHT_PROMPT":
+        _saved_per_prompt += len(semantic_prompt.prompt_start_right()) + 1
+    elif name == "BOTTOM_TOOLBAR":
+        _saved_per_prompt += len(semantic_prompt.prompt_start_secondary())
+    # continuation lines are marked only when there are some, not counted
+
+
+def apply_low_bandwidth():
+    """switch the loaded features to the low-bandwidth profile, e.g. once
+    the terminal turned out slow"""
+    global _saved_per_command
+    env = XSH.env
+    for name, (installed, user_value) in list(_optional_prompts.items()):
+        if env.get(name) is installed:
+            env[name] = user_value
+            _skip_prompt_marks(name)
+        if name == "MULTILINE_PROMPT":
+            # the continuation marks set up by semantic_prompt.MultilinePrompt
+            for var, mark in [
+                ("MULTILINE_PROMPT_PRE", semantic_prompt.prompt_start_continue()),
+                ("MULTILINE_PROMPT_POS", semantic_prompt.prompt_end_input_start()),
+            ]:
+                if env.get(var) == utils.ansi_esc(mark):
+                    env[var] = ""
+    _optional_prompts.clear()
+    for name in list(loaded):
+        if not affordable(FEATURES[name]):
+            unload(name)
+            _saved_per_command += FEATURES[name].cost
+    _low_bandwidth_hooks()
+
+
+def _low_bandwidth_hooks():
+    global _low_bandwidth_hooked
+    if _low_bandwidth_hooked:
+        return
+    _low_bandwidth_hooked = True
+    on("on_post_prompt")(drop_aid)
+    on("on_pre_prompt")(count_prompt_savings)
+    on("on_precommand")(count_command_savings)
+
+
+def drop_aid(**_):
+    """the terminal knows the shell's ``aid`` once the first prompt was shown"""
+    global _aid_dropped
+    if _primary is not None and not _aid_dropped:
+        opt = dict(_primary.ext_opt)
+        opt.pop("aid", None)
+        _primary.ext_opt = opt
+        _aid_dropped = True
+
+
+def count_prompt_savings(**_):
+    saved = _saved_per_prompt
+    if _aid_dropped:
+        saved += len(aid_option())
+    bandwidth.saved_bytes += saved
+
+
+def count_command_savings(**_):
+    bandwidth.saved_bytes += _saved_per_command
@@ -2,8 +2,9 @@
 # gitlab.freedesktop.org/Per_Bothner/specifications/blob/master/
 # proposals/semantic-prompts.md
 
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Optional, Tuple
 
+from . import stats
 from .utils import (
     Codes,
     ansi_esc,
@@ -107,6 +108,20 @@ def write_cmd_end(opt=None):
 
 
 class ShellIntegrationPrompt:
+    """Wraps a prompt with the OSC 133 sequences marking its semantic zone.
+
+    The wrapping strings depend only on ``prompt_name``, ``extend`` and ``ext_opt``,
+    so they are formed once and reused on every render.
+    Assigning ``extend`` or ``ext_opt`` (or calling ``invalidate``) forms them again.
+    Constructing one returns the subclass for ``prompt_name`` (see ``PROMPT_KINDS``),
+    so a render doesn't branch on the prompt kind.
+    """
+
+    def __new__(cls, env: "Env", prompt_name="PROMPT", *args, **kwargs):
+        if cls is ShellIntegrationPrompt:
+            cls = PROMPT_KINDS.get(prompt_name, ShellIntegrationPrompt)
+        return super().__new__(cls)
+
     def __init__(
         self,
         env: "Env",
@@ -115,41 +130,142 @@ class ShellIntegrationPrompt:
         ext_opt: Optional[dict] = None,
     ):
         self.env = env
-        self.extend = extend
-        self.ext_opt = ext_opt or {}
+        self._extend = extend
+        self._ext_opt = ext_opt or {}
         self.prompt_name = prompt_name
         self.old_prompt = env[prompt_name]
+        self._wrappers: Optional[Tuple[str, str]] = None
 
-    def __call__(self, **_):
-        prompt = self.old_prompt() if callable(self.old_prompt) else self.old_prompt
+    @property
+    def extend(self):
+        return self._extend
+
+    @extend.setter
+    def extend(self, value):
+        self._extend = value
+        self.invalidate()
+
+    @property
+    def ext_opt(self):
+        return self._ext_opt
+
+    @ext_opt.setter
+    def ext_opt(self, value: Optional[dict]):
+        self._ext_opt = value or {}
+        self.invalidate()
+
+    def invalidate(self):
+        self._wrappers = None
+
+    def form_wrappers(self) -> Optional[Tuple[str, str]]:
+        """escaped (prefix, suffix) pair, None when the prompt isn't wrapped"""
         if not self.extend:
-            prefix, suffix = (
-                form() for form in [form_term_prompt_prefix, form_term_prompt_suffix]
-            )
+            prefix, suffix = form_term_prompt_prefix(), form_term_prompt_suffix()
         else:
-            if self.prompt_name == "PROMPT":
-                prefix = line_new_cmd_new(self.ext_opt) + prompt_start_primary()
-                suffix = prompt_end_input_start()
-            elif (
-                self.prompt_name == "RIGHT_PROMPT"
-            ):  # todo: bugs https://github.com/wez/wezterm/issues/3115
-                prefix = prompt_start_right()
-                suffix = "\n"  # spec mandates ending witn a ␤?
-            elif self.prompt_name == "BOTTOM_TOOLBAR":
-                prefix = prompt_start_secondary()
-                suffix = ""  # ... ␤ bugs and adds and extra empty line
-            elif self.prompt_name == "MULTILINE_PROMPT":
-                env = self.env
-                prefix, suffix = "", ""
-                _pre, _pos = "MULTILINE_PROMPT_PRE", "MULTILINE_PROMPT_POS"
-                if not (_pre_val := env.get(_pre)) and not _pre_val == "":
-                    env[_pre] = ansi_esc(prompt_start_continue())
-                if not (_pos_val := env.get(_pos)) and not _pos_val == "":
-                    env[_pos] = ansi_esc(prompt_end_input_start())
-            else:
-                return prompt
+            wrappers = self.extended_wrappers()
+            if wrappers is None:
+                return None
+            prefix, suffix = wrappers
         prefix = (
             ansi_esc(prefix) if prefix else ""
         )  # don't escape empty pre/suf-fix (breaks multiline prompts)
         suffix = ansi_esc(suffix) if suffix else ""
+        return prefix, suffix
+
+    def extended_wrappers(self) -> Optional[Tuple[str, str]]:
+        """unescaped (prefix, suffix) marking this kind of prompt with options"""
+        return None
+
+    def render(self) -> str:
+        return self.old_prompt() if callable(self.old_prompt) else self.old_prompt
+
+    def wrap(self, prompt: str) -> str:
+        if self._wrappers is None:
+            self._wrappers = self.form_wrappers() or ("", "")
+        prefix, suffix = self._wrappers
         return prefix + prompt + suffix
+
+    def __call__(self, **_):
+        return self.wrap(self.render())
+
+
+class PrimaryPrompt(ShellIntegrationPrompt):
+    def extended_wrappers(self):
+        prefix = line_new_cmd_new(self.ext_opt) + prompt_start_primary()
+        return prefix, prompt_end_input_start()
+
+
+class MemoizedPrompt(ShellIntegrationPrompt):
+    """Redrawn on every keystroke, so the wrapped string is kept
+    as long as the wrapped prompt renders the same."""
+
+    # the last rendered prompt and its wrapped string
+    _last: Optional[Tuple[str, str]] = None
+
+    def invalidate(self):
+        super().invalidate()
+        self._last = None
+
+    def __call__(self, **_):
+        prompt = self.render()
+        last = self._last
+        if last is not None and last[0] == prompt:
+            return last[1]
+        wrapped = self.wrap(prompt)
+        self._last = prompt, wrapped
+        return wrapped
+
+
+class RightPrompt(MemoizedPrompt):
+    def extended_wrappers(self):
+        # todo: bugs https://github.com/wez/wezterm/issues/3115
+        return prompt_start_right(), "\n"  # spec mandates ending witn a ␤?
+
+
+class ToolbarPrompt(MemoizedPrompt):
+    def extended_wrappers(self):
+        # ... ␤ bugs and adds and extra empty line
+        return prompt_start_secondary(), ""
+
+
+class MultilinePrompt(ShellIntegrationPrompt):
+    """The continuation zones are marked through $MULTILINE_PROMPT_PRE/POS,
+    set once instead of on every render."""
+
+    def __init__(self, env: "Env", *args, **kwargs):
+        super().__init__(env, *args, **kwargs)
+        if self.extend:
+            self.setup_multiline()
+
+    def invalidate(self):
+        # e.g. ``extend`` turned on
+        super().invalidate()
+        if self.extend:
+            self.setup_multiline()
+
+    def extended_wrappers(self):
+        return "", ""
+
+    def setup_multiline(self):
+        env = self.env
+        _pre, _pos = "MULTILINE_PROMPT_PRE", "MULTILINE_PROMPT_POS"
+        if not (_pre_val := env.get(_pre)) and not _pre_val == "":
+            env[_pre] = ansi_esc(prompt_start_continue())
+        if not (_pos_val := env.get(_pos)) and not _pos_val == "":
+            env[_pos] = ansi_esc(prompt_end_input_start())
+
+
+PROMPT_KINDS = {
+    "PROMPT": PrimaryPrompt,
+    "RIGHT_PROMPT": RightPrompt,
+    "BOTTOM_TOOLBAR": ToolbarPrompt,
+    "MULTILINE_PROMPT": MultilinePrompt,
+}
+
+
+def wrap_prompt(env: "Env", prompt_name="PROMPT", **kwargs):
+    """replace ``env[prompt_name]`` by its ``ShellIntegrationPrompt``
+    (timed as the ``render_<prompt_name>`` hook when stats are enabled)"""
+    prompt = ShellIntegrationPrompt(env, prompt_name=prompt_name, **kwargs)
+    env[prompt_name] = stats.instrument(f"render_{prompt_name.lower()}")(prompt)
+    return prompt
@@ -0,0 +1,164 @@
+"""Opt-in timing counters for the integration hooks.
+
+Enable with ``$XONTRIB_TERM_INTEGRATIONS_STATS = True`` before loading the xontrib,
+then inspect them with the ``term_integration_stats`` alias.
+Hooks are left untouched when disabled, so there is no overhead by default.
+"""
+import functools
+import math
+import os
+import socket
+import time
+from array import array
+from typing import Dict, Optional
+
+from xonsh.built_ins import XSH
+
+from . import utils
+
+# latest samples kept per hook for the percentiles
+RING_SIZE = 1024
+
+
+class HookStats:
+    __slots__ = ("calls", "total_ns", "max_ns", "bytes", "ring")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.bytes = 0
+        self.ring = array("q", bytes(8 * RING_SIZE))
+
+    def record(self, took_ns: int, nbytes: int):
+        self.ring[self.calls % RING_SIZE] = took_ns
+        self.calls += 1
+        self.total_ns += took_ns
+        self.bytes += nbytes
+        if took_ns > self.max_ns:
+            self.max_ns = took_ns
+
+    def percentile(self, pct: float) -> int:
+        samples = sorted(self.ring[: min(self.calls, RING_SIZE)])
+        if not samples:
+            return 0
+        # nearest rank: the p99 of a few samples is their max
+        return samples[max(0, math.ceil(pct * len(samples)) - 1)]
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_us": self.total_ns / 1000,
+            "avg_us": self.total_ns / 1000 / self.calls if self.calls else 0,
+            "max_us": self.max_ns / 1000,
+            "p99_us": self.percentile(0.99) / 1000,
+            "bytes": self.bytes,
+        }
+
+
+hooks: Dict[str, HookStats] = {}
+
+
+def enabled() -> bool:
+    return bool((XSH.env or {}).get("XONTRIB_TERM_INTEGRATIONS_STATS", False))
+
+
+def recording() -> bool:
+    # checked here, ``recorder`` (json, argparse, ...) is imported only when used
+    return bool((XSH.env or {}).get("XONTRIB_TERM_INTEGRATIONS_RECORD"))
+
+
+def instrument(name: str):
+    """decorator recording the call count, latency and bytes written by a hook,
+    and attributing its writes to it in the ``recorder`` log"""
+
+    def decorator(func):
+        timed = enabled()
+        recorded = recording()
+        if not (timed or recorded):
+            return func
+        if recorded:
+            from . import recorder
+        # added on the first call: hooks of features that aren't loaded
+        # don't show up in the table
+        stats: Optional[HookStats] = None
+        utils.count_bytes = True
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal stats
+            outer, utils.current_hook = utils.current_hook, name
+            written = utils.bytes_written
+            start = time.perf_counter_ns()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                took = time.perf_counter_ns() - start
+                utils.current_hook = outer
+                if stats is None:
+                    stats = hooks.setdefault(name, HookStats())
+                stats.record(took, utils.bytes_written - written)
+                if recorded and utils.record is not None:
+                    if isinstance(result, str):  # a rendered prompt
+                        recorder.record_prompt(name, result)
+                    recorder.record_hook(name, took)
+
+        return wrapper
+
+    return decorator
+
+
+def hook(func):
+    """``instrument`` using the function's name"""
+    return instrument(func.__name__)(func)
+
+
+def report() -> dict:
+    from . import bandwidth, registry
+
+    env = XSH.env or {}
+    return {
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "term": env.get("TERM", ""),
+        "term_program": env.get("TERM_PROGRAM", ""),
+        "features": list(registry.loaded),
+        "user_vars_truncated": utils.user_vars_truncated,
+        "user_vars_dropped": utils.async_writer.dropped if utils.async_writer else 0,
+        "low_bandwidth": bandwidth.report(),
+        "hooks": {name: stats.as_dict() for name, stats in hooks.items()},
+    }
+
+
+def reset():
+    for stats in hooks.values():
+        stats.clear()
+    utils.user_vars_truncated = 0
+
+
+def format_low_bandwidth(row: dict) -> str:
+    if not row.get("active"):
+        return "low bandwidth: off"
+    return f"low bandwidth: on ({row['reason']}), ~{row['saved_bytes']} bytes saved"
+
+
+def format_table(data: dict) -> str:
+    lines = [
+        f"features: {', '.join(data.get('features', []))}",
+        f"user vars truncated: {data.get('user_vars_truncated', 0)}, "
+        f"dropped: {data.get('user_vars_dropped', 0)}",
+        format_low_bandwidth(data.get("low_bandwidth", {})),
+        f"{'hook':<28} {'calls':>7} {'avg us':>9} {'p99 us':>9} {'max us':>9} "
+        f"{'bytes':>9}",
+    ]
+    for name, row in sorted(data["hooks"].items()):
+        lines.append(
+            f"{name:<28} {row['calls']:>7} {row['avg_us']:>9.1f} "
+            f"{row['p99_us']:>9.1f} {row['max_us']:>9.1f} {row['bytes']:>9}"
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,47 @@
+"""Wall (and optionally CPU) time of each command, for the ``133;D`` mark.
+
+Measured between ``on_precommand`` and ``on_postcommand`` with monotonic clocks
+into one reused record; the CPU time of the command's processes comes from
+``getrusage(RUSAGE_CHILDREN)`` deltas (``$XONTRIB_TERM_INTEGRATIONS_CMD_CPU_TIME``),
+so nothing is forked.
+"""
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None  # type: ignore
+
+
+def children_cpu_ns() -> int:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return int((usage.ru_utime + usage.ru_stime) * 1e9)
+
+
+class CommandTiming:
+    __slots__ = ("cpu", "start_ns", "cpu_start_ns", "dur_ms", "cpu_ms", "opts")
+
+    def __init__(self, cpu=False):
+        self.cpu = cpu and resource is not None
+        self.start_ns = 0
+        self.cpu_start_ns = 0
+        self.dur_ms = 0
+        self.cpu_ms = 0
+        # ``133;D`` options of the last command, e.g. ";dur=1250;cpu=980"
+        self.opts = ""
+
+    def start(self):
+        if self.cpu:
+            self.cpu_start_ns = children_cpu_ns()
+        self.start_ns = time.monotonic_ns()
+
+    def stop(self):
+        self.dur_ms = (time.monotonic_ns() - self.start_ns) // 1_000_000
+        if self.cpu:
+            self.cpu_ms = (children_cpu_ns() - self.cpu_start_ns) // 1_000_000
+            self.opts = f";dur={self.dur_ms};cpu={self.cpu_ms}"
+        else:
+            self.opts = f";dur={self.dur_ms}"
+
+
+record = CommandTiming()
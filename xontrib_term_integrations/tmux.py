@@ -0,0 +1,111 @@
+"""How escape sequences reach the outer terminal from inside tmux.
+
+tmux is probed once, in the background, at session start:
+
+- ``passthrough``: wrap in the DCS ``tmux;`` sequence (once per nested tmux,
+  ``$XONTRIB_TERM_INTEGRATIONS_TMUX_DEPTH``, default 1)
+- ``drop``: ``allow-passthrough`` is off, tmux would discard them anyway
+- ``direct``: not inside tmux
+
+The wrapper around a fixed head/tail is formed once, so wrapping a payload
+without ESC bytes (e.g. the base64 value of a user var) is a single concatenation.
+"""
+import contextlib
+import subprocess
+import threading
+from typing import Dict, Optional, Tuple
+
+from xonsh.built_ins import XSH
+
+PASSTHROUGH = "passthrough"
+DROP = "drop"
+DIRECT = "direct"
+
+ESC = "\x1b"
+DCS = ESC + "P"
+ST = ESC + "\\"
+
+
+def wrap(code: str, depth=1) -> str:
+    # github.com/tmux/tmux/wiki/FAQ#what-is-the-passthrough-escape-sequence-and-how-do-i-use-it
+    # ESC in the wrapped sequence must be doubled
+    for _ in range(depth):
+        code = f"{DCS}tmux;{code.replace(ESC, ESC + ESC)}{ST}"
+    return code
+
+
+class Strategy:
+    __slots__ = ("mode", "depth", "_affixes")
+
+    def __init__(self, mode: str, depth=1):
+        self.mode = mode
+        self.depth = depth
+        self._affixes: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+    def wrap(self, code: str) -> Optional[str]:
+        """the sequence as it must be written, None when it should be dropped"""
+        if self.mode == DIRECT:
+            return code
+        if self.mode == DROP:
+            return None
+        return wrap(code, self.depth)
+
+    def affixes(self, head: str, tail: str) -> Tuple[str, str]:
+        """prefix and suffix wrapping ``head + payload + tail`` for payloads
+        without ESC, i.e. ``prefix + payload + suffix``"""
+        key = (head, tail)
+        if key not in self._affixes:
+            marker = "\0"
+            prefix, suffix = (self.wrap(head + marker + tail) or marker).split(marker)
+            self._affixes[key] = prefix, suffix
+        return self._affixes[key]
+
+
+_strategy: Optional[Strategy] = None
+
+
+def _depth() -> int:
+    return int(XSH.env.get("XONTRIB_TERM_INTEGRATIONS_TMUX_DEPTH", 1))
+
+
+def probe() -> str:
+    """the mode tmux's ``allow-passthrough`` option calls for"""
+    from .utils import detyped_env
+
+    with contextlib.suppress(OSError, subprocess.SubprocessError):
+        proc = subprocess.run(
+            ["tmux", "show-options", "-gv", "allow-passthrough"],
+            capture_output=True,
+            text=True,
+            env=detyped_env(),
+            timeout=2,
+        )
+        if proc.returncode != 0:
+            # tmux < 3.3 has no such option and always passes DCS through
+            return PASSTHROUGH
+        return DROP if proc.stdout.strip() == "off" else PASSTHROUGH
+    return PASSTHROUGH
+
+
+def _probe_in_background():
+    global _strategy
+    _strategy = Strategy(probe(), _depth())
+
+
+def start() -> Strategy:
+    """choose the strategy for this session, probing tmux in the background.
+    Until the probe finishes sequences are wrapped for passthrough."""
+    global _strategy
+    if not (XSH.env or {}).get("TMUX"):
+        _strategy = Strategy(DIRECT)
+        return _strategy
+    # returned as is, the probe may replace the global meanwhile
+    initial = _strategy = Strategy(PASSTHROUGH, _depth())
+    threading.Thread(
+        target=_probe_in_background, name="tmux-probe", daemon=True
+    ).start()
+    return initial
+
+
+def strategy() -> Strategy:
+    return _strategy or start()
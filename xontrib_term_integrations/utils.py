@@ -1,9 +1,15 @@
-import base64
+import binascii
+import contextlib
+import functools
+import os
 import sys
-from typing import Optional
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Optional, Set
 
 from xonsh.built_ins import XSH
-from xonsh.cli_utils import Annotated, Arg, ArgParserAlias
+
+from . import tmux
 
 
 class Codes:
@@ -31,6 +37,17 @@ def opt_dict_to_str(opt):
     return ""
 
 
+def detyped_env() -> dict:
+    """environment snapshot shared by every subprocess this xontrib launches.
+
+    ``Env.detype`` memoizes its result and drops it only when a variable is set or
+    deleted, so this is a lookup rather than a rebuild on every call."""
+    env = XSH.env
+    if env is None:
+        return dict(os.environ)
+    return env.detype()
+
+
 def ansi_esc(code: str):
     return "\001" + code + "\002"
 
@@ -54,7 +71,7 @@ def term_dcs_cmd(code):
 def term_tmux_cmd(code):
     # github.com/tmux/tmux/wiki/FAQ#what-is-the-passthrough-escape-sequence-and-how-do-i-use-it
     # ESC in the wrapped sequence must be doubled
-    return term_dcs_cmd(esc_esc(code))
+    return term_dcs_cmd("tmux;" + esc_esc(code))
 
 
 def esc_esc(code):  # doubles ESC (or escapes ESC with another ESC)
@@ -102,11 +119,89 @@ def write_osc_cmd_status(status):
     return write_term_mark(f"D;{status}")
 
 
-def write_to_out(code: str):
+# sequences collected while an event handler runs, see ``batched``
+_batch: Optional[List[str]] = None
+# the droppable ones (user vars) among them, written after the others
+_batch_droppable: List[str] = []
+# total written to the terminal, counted only when the stats are enabled
+count_bytes = False
+bytes_written = 0
+# called with every write while recording, see ``recorder``
+record: Optional[Callable[[str], None]] = None
+# the instrumented hook that is running, see ``stats.instrument``
+current_hook = ""
+# writes from a background thread when set, see ``writer``
+async_writer = None
+# called with the latency of each write+flush, see ``bandwidth``
+write_monitor: Optional[Callable[[int], None]] = None
+
+
+def write_to_out(code: str, droppable=False):
+    """write ``code`` to the terminal. A ``droppable`` one may be skipped
+    by the async writer when the terminal can't keep up."""
+    global bytes_written
+    # counted when written by a hook, not when its batch is, so that each
+    # callback of a batched event gets its own bytes in the stats
+    if count_bytes:
+        bytes_written += len(code.encode())
+    if _batch is not None:
+        (_batch_droppable if droppable else _batch).append(code)
+        return
+    _emit(code, droppable)
+
+
+def _emit(code: str, droppable=False):
+    if record is not None:
+        record(code)
+    if async_writer is not None:
+        async_writer.put(sys.stdout, code, droppable)
+        return
+    if write_monitor is not None:
+        start = time.perf_counter_ns()
+        sys.stdout.write(code)
+        sys.stdout.flush()
+        write_monitor(time.perf_counter_ns() - start)
+        return
     sys.stdout.write(code)
     sys.stdout.flush()
 
 
+@contextlib.contextmanager
+def batched_output():
+    """collect everything written inside the block and emit it with a single
+    write+flush. ``$XONTRIB_TERM_INTEGRATIONS_NO_BATCH`` writes them one by one."""
+    global _batch, _batch_droppable
+    if _batch is not None or XSH.env.get("XONTRIB_TERM_INTEGRATIONS_NO_BATCH", False):
+        yield
+        return
+    _batch, _batch_droppable = [], []
+    try:
+        yield
+    finally:
+        codes, _batch = _batch, None
+        text = "".join(codes)
+        if text:
+            _emit(text)
+        if _batch_droppable:
+            _emit("".join(_batch_droppable), droppable=True)
+            _batch_droppable = []
+            if async_writer is not None and async_writer.at_boundary(text):
+                # the user vars sent with a 133;C/D mark (e.g. WEZTERM_PROG)
+                # also come before/after the command's output
+                async_writer.drain()
+
+
+def batched(func):
+    """decorator for event handlers emitting several sequences"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with batched_output():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
 def write_osc_shell_integration():
     # OSC 1337 ; ShellIntegrationVersion=[Pn] ; [Ps] ST
     write_osc_cmd("ShellIntegrationVersion=15;shell=xonsh")
@@ -117,11 +212,17 @@ def write_osc_cwd(newdir):
     write_osc_cmd(f"CurrentDir={newdir}")
 
 
+@functools.lru_cache(maxsize=256)
+def file_url(host, path):
+    # percent-encoded once per directory, spaces and non-ASCII names included
+    return f"file://{host}{urllib.parse.quote(path)}"
+
+
 def write_osc7_cwd(host, newdir):
     # OSC 7 ; [Ps] ST
     #         [Ps] is a file URL with a hostname and a path
     #         like file://example.com/usr/bin
-    write_osc7_cmd(f"file://{host}{newdir}")
+    write_osc7_cmd(file_url(host, newdir))
 
 
 def write_osc_user_host(env):
@@ -131,45 +232,137 @@ def write_osc_user_host(env):
         write_osc_cmd(f"RemoteHost={user}@{host}")
 
 
+USER_VAR_HEAD = f"{Codes.OSC}1337;SetUserVar="
+
+# last value sent to the terminal for each user var in this session
+_user_vars: Dict[str, str] = {}
+# vars the terminal may have missed, sent again on their next update
+_unsent: Set[str] = set()
+
+
+# reused for the truncated user var values
+_payload = bytearray()
+TRUNCATION_MARK = "…".encode()
+# how often a user var value was cut, shown by ``term_integration_stats``
+user_vars_truncated = 0
+
+
+def bounded_payload(val_b: bytes):
+    """``val_b``, or its head and tail around a "…" when it is longer than
+    ``$XONTRIB_TERM_INTEGRATIONS_USER_VAR_MAX_BYTES`` (e.g. a pasted heredoc).
+    With ``$XONTRIB_TERM_INTEGRATIONS_USER_VAR_HASH`` the mark carries a hash
+    of the whole value, so different long values stay distinguishable.
+    A limit below the size of the mark (3 bytes, 20 with the hash) sends the mark."""
+    global user_vars_truncated
+    limit = int(XSH.env.get("XONTRIB_TERM_INTEGRATIONS_USER_VAR_MAX_BYTES", 1024))
+    if limit <= 0 or len(val_b) <= limit:
+        return val_b
+    mark = TRUNCATION_MARK
+    if XSH.env.get("XONTRIB_TERM_INTEGRATIONS_USER_VAR_HASH", False):
+        import hashlib
+
+        digest = hashlib.blake2b(val_b, digest_size=6).hexdigest()
+        mark = b"%s[%s]%s" % (TRUNCATION_MARK, digest.encode(), TRUNCATION_MARK)
+    if len(val_b) <= len(mark):
+        # cutting it wouldn't make it shorter
+        return val_b
+    user_vars_truncated += 1
+    keep = max(limit - len(mark), 0)
+    # cut at character boundaries, continuation bytes are 0b10xxxxxx
+    head = (keep + 1) // 2
+    while head and val_b[head] & 0xC0 == 0x80:
+        head -= 1
+    tail = len(val_b) - keep // 2
+    while tail < len(val_b) and val_b[tail] & 0xC0 == 0x80:
+        tail += 1
+    view = memoryview(val_b)
+    _payload.clear()
+    _payload.extend(view[:head])
+    _payload.extend(mark)
+    _payload.extend(view[tail:])
+    return _payload
+
+
 def set_user_var(
     var, val
 ):  # emit an OSC 1337 sequence to set a user var associated with the current
     # terminal pane
     if not type(val) == str:
         val = str(val)
-    val_b = val.encode("utf8")
-    val_b64 = base64.b64encode(val_b)
-    val_s64 = val_b64.decode("utf8")
-    user_var = f"SetUserVar={var}={val_s64}"
-    if XSH.env.get("TMUX", ""):
-        # github.com/tmux/tmux/wiki/FAQ
-        # #what-is-the-passthrough-escape-sequence-and-how-do-i-use-it
+    _user_vars[var] = val
+    _unsent.discard(var)
+    strategy = tmux.strategy()
+    if strategy.mode == tmux.DROP:
         # Add "set -g allow-passthrough on" to your tmux.conf
-        write_tmux_cmd(term_osc_cmd(user_var))
-    else:
-        write_osc_cmd(user_var)
-
-
-def set_user_var_fn(
-    var: str, val: Annotated[Optional[str], Arg(nargs="?")] = ""  # noqa
-):
-    """Sets a terminal pane's user `Variable` to a given `Value`
-    (see ``wezfurlong.org/wezterm/shell-integration.html#user-vars`` for details)
-
-    Parameters
-    ----------
-    var
-        Variable name
-    val
-        Variable value (defaults to an empty string)
-    """
-
-    set_user_var(var, val)
-
-
-set_user_var_alias = ArgParserAlias(
-    func=set_user_var_fn, has_args=True, prog="set_user_var"
-)
-set_wezterm_user_var_alias = ArgParserAlias(
-    func=set_user_var_fn, has_args=True, prog="set_wezterm_user_var"
-)
+        return
+    val_b = bounded_payload(val.encode("utf8"))
+    val_b64 = binascii.b2a_base64(val_b, newline=False)
+    val_s64 = val_b64.decode("utf8")
+    # wrapped for tmux passthrough when needed
+    prefix, suffix = strategy.affixes(USER_VAR_HEAD, Codes.BEL)
+    write_to_out(f"{prefix}{var}={val_s64}{suffix}", droppable=True)
+
+
+def update_user_var(var, val):
+    """Same as ``set_user_var``, but nothing is sent when the terminal already has
+    the value. Use it for the vars emitted on every prompt/command."""
+    if not type(val) == str:
+        val = str(val)
+    if _user_vars.get(var) != val or var in _unsent:
+        set_user_var(var, val)
+
+
+def mark_user_vars_unsent():
+    """the terminal may have missed some user vars (e.g. dropped by the async
+    writer), send them again on their next update"""
+    _unsent.update(_user_vars)
+
+
+def resync_user_vars():
+    """Send all the user vars again, e.g. after re-attaching to a terminal
+    that doesn't know their values anymore"""
+    with batched_output():
+        for var, val in list(_user_vars.items()):
+            set_user_var(var, val)
+
+
+class LazyAlias:
+    """Stands in for an alias of the ``aliases`` module,
+    which is imported only once the alias is run or completed."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @property
+    def alias(self):
+        from . import aliases
+
+        return getattr(aliases, self.name)
+
+    def __call__(
+        self, args, stdin=None, stdout=None, stderr=None, spec=None, stack=None
+    ):
+        return self.alias(
+            args, stdin=stdin, stdout=stdout, stderr=stderr, spec=spec, stack=stack
+        )
+
+    def xonsh_complete(self, *args, **kwargs):
+        return self.alias.xonsh_complete(*args, **kwargs)
+
+
+_MOVED_TO_ALIASES = {
+    "set_user_var_fn",
+    "set_user_var_alias",
+    "set_wezterm_user_var_alias",
+    "resync_user_vars_fn",
+    "resync_user_vars_alias",
+}
+
+
+def __getattr__(name):
+    # keep ``from xontrib_term_integrations.utils import set_user_var_alias`` working
+    if name in _MOVED_TO_ALIASES:
+        from . import aliases
+
+        return getattr(aliases, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
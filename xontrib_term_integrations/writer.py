@@ -0,0 +1,103 @@
+"""Writes the integration's sequences from a background thread.
+
+Opt in with ``$XONTRIB_TERM_INTEGRATIONS_ASYNC_WRITER = True``: a slow or
+backpressured terminal (a congested SSH link, a paused tmux pane) then no longer
+stalls the event handlers. The queue is ordered and bounded
+(``$XONTRIB_TERM_INTEGRATIONS_ASYNC_WRITER_QUEUE`` writes, default 64).
+Writes holding the ``133;C``/``133;D`` command marks wait until the queue is
+written out, so they still come before/after the command's own output.
+When the queue is full, user vars are dropped instead of waiting for room.
+"""
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+# a write containing any of them waits until everything queued is written
+BOUNDARIES = ("\x1b]133;C", "\x1b]133;D")
+
+_STOP = object()
+
+
+class AsyncWriter:
+    def __init__(self, maxsize=64, on_drop: Optional[Callable[[], None]] = None):
+        self.queue: "queue.Queue" = queue.Queue(maxsize)
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.thread = threading.Thread(
+            target=self._run, name="term-integration-writer", daemon=True
+        )
+        self.thread.start()
+
+    @staticmethod
+    def at_boundary(code: str) -> bool:
+        return any(mark in code for mark in BOUNDARIES)
+
+    def put(self, stream, code: str, droppable=False):
+        if droppable:
+            try:
+                self.queue.put_nowait((stream, code))
+            except queue.Full:
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop()
+                return
+        else:
+            self.queue.put((stream, code))
+        if self.at_boundary(code):
+            self.drain()
+
+    def drain(self):
+        """wait until everything queued is written"""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                stream, code = item
+                stream.write(code)
+                # one flush for a burst of writes
+                if self.queue.empty():
+                    stream.flush()
+            except (OSError, ValueError):
+                pass  # the terminal is gone or the stream got closed
+            finally:
+                self.queue.task_done()
+
+    def stop(self, timeout=1.0):
+        """write out what is queued, waiting at most ``timeout`` seconds"""
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            # the terminal isn't reading, the daemon thread goes with the process
+            return
+        self.thread.join(max(deadline - time.monotonic(), 0))
+
+
+writer: Optional[AsyncWriter] = None
+
+
+def start(maxsize=64) -> AsyncWriter:
+    global writer
+    from . import utils
+
+    if writer is None:
+        writer = AsyncWriter(maxsize, on_drop=utils.mark_user_vars_unsent)
+        utils.async_writer = writer
+        atexit.register(stop)
+    return writer
+
+
+def stop():
+    global writer
+    from . import utils
+
+    if writer is not None:
+        utils.async_writer = None
+        writer.stop()
+        writer = None